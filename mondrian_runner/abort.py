@@ -1,4 +1,5 @@
 from mondrian_runner import utils
+from mondrian_runner.cromwell_client import get_client
 
 
 def abort(server_url, cache_dir, run_id):
@@ -11,6 +12,4 @@ def abort(server_url, cache_dir, run_id):
     if run_id is None:
         run_id = utils.get_latest_id_from_cache_dir(cache_dir)
 
-    cmd = ['curl', '-X', 'POST', '{}/api/workflows/v1/{}/abort'.format(server_url, run_id)]
-
-    utils.run_cmd(cmd)
+    get_client(server_url).abort(run_id)
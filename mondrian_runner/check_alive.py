@@ -1,27 +1,19 @@
-import json
 import os
-import random
 import subprocess
+import sys
+import time
 
+from mondrian_runner.job_info import minutes_to_walltime
+from mondrian_runner.job_info import retrieve_job_information
+from mondrian_runner.job_info import update_job_information
+from mondrian_runner.job_info import walltime_to_minutes
+from mondrian_runner.job_samples import JobSamples
+from mondrian_runner.lsf import JobSnapshot
 
-def _get_working_dir(job_id):
-    cmd = ['bjobs', '-o', 'EXEC_CWD:1024', '-json', job_id]
-    stdout = subprocess.check_output(cmd).decode()
-    stdout = json.loads(stdout)
-
-    assert stdout['JOBS'] == 1
-    record = stdout['RECORDS'][0]
-
-    if 'ERROR' in record:
-        raise Exception()
 
-    return record['EXEC_CWD']
-
-
-def create_rc_file_on_fail(job_id):
-    working_dir = _get_working_dir(job_id)
-    rcfile = os.path.join(working_dir, 'execution', 'rc')
-    rcfile_tmp = os.path.join(working_dir, 'execution', 'rc.tmp')
+def create_rc_file_on_fail(record):
+    rcfile = os.path.join(record.exec_cwd, 'execution', 'rc')
+    rcfile_tmp = os.path.join(record.exec_cwd, 'execution', 'rc.tmp')
 
     if os.path.exists(rcfile):
         return
@@ -36,122 +28,210 @@ def create_rc_file_on_fail(job_id):
     os.rename(rcfile_tmp, rcfile)
 
 
-def kill_job(job_id):
-    cmd = ['bkill', job_id]
-    # logging.info('killing job id: {}'.format(job_id))
-    stdout = subprocess.check_output(cmd).decode()
-    print(stdout)
-
-    create_rc_file_on_fail(job_id)
-
-
-def _is_avg_mem_usage_high(job_id):
-    cmd = ['bjobs', '-o', 'AVG_MEM:15 MAX_MEM:15 MEMLIMIT:15 SLOTS:10', '-json', job_id]
-    stdout = subprocess.check_output(cmd).decode()
-    stdout = json.loads(stdout)
-
-    assert stdout['JOBS'] == 1
-    record = stdout['RECORDS'][0]
-
-    if 'ERROR' in record:
-        raise Exception()
+# exit reasons recorded for jobs killed by check_alive, lsf reports these as TERM_OWNER
+KILLED_HUNG_ON_MEMORY = 'TERM_MEMLIMIT: killed by mondrian_runner, hung at the memory limit'
+KILLED_STALLED = 'TERM_STALLED: killed by mondrian_runner, no cpu progress'
 
-    max_mem = record['MAX_MEM']
-    if max_mem == "":
-        return
-    assert max_mem.endswith('Gbytes'), max_mem
-    max_mem = max_mem.replace(' Gbytes', '')
-    max_mem = float(max_mem)
 
-    avg_mem = record['AVG_MEM']
-    if avg_mem == "":
+def record_exit_accounting(record, exit_reason=None):
+    """
+    persist how the job ended next to the job so retries do not depend
+    on lsf still reporting it. the first reason recorded is kept, later
+    checks of a job killed here would see lsf's TERM_OWNER instead
+    """
+    # killed before it was dispatched, there is no call dir to write to
+    if record.exec_cwd is None:
         return
-    assert avg_mem.endswith('Gbytes'), max_mem
-    avg_mem = avg_mem.replace(' Gbytes', '')
-    avg_mem = float(avg_mem)
 
-    requested_mem = record['MEMLIMIT']
-    if requested_mem == "":
+    try:
+        job_info = retrieve_job_information(record.exec_cwd)
+    except FileNotFoundError:
         return
-    assert requested_mem.endswith('G'), max_mem
-    requested_mem = requested_mem.replace(' G', '')
-    requested_mem = float(requested_mem)
 
-    cpu = record['SLOTS']
-    if cpu == "":
+    if 'exit_reason' in job_info:
         return
-    cpu = int(cpu)
-    requested_mem = requested_mem * cpu
 
-    if max_mem >= requested_mem:
-        if avg_mem == requested_mem - 1:
-            return True
-        if avg_mem / requested_mem >= 0.9:
-            return True
+    if exit_reason is None:
+        exit_reason = record.exit_reason or ''
 
+    update_job_information(
+        record.exec_cwd,
+        {
+            'status': record.status,
+            'exit_reason': exit_reason,
+            'max_mem': record.max_mem,
+            'run_time': record.run_time,
+            'exec_host': record.exec_hosts[0] if record.exec_hosts else None,
+        }
+    )
 
-def _is_mem_usage_high(job_id):
-    cmd = ['bjobs', '-o', 'MAX_MEM:15 MEMLIMIT:15 SLOTS:10', '-json', job_id]
-    stdout = subprocess.check_output(cmd).decode()
-    stdout = json.loads(stdout)
-
-    assert stdout['JOBS'] == 1
-    record = stdout['RECORDS'][0]
 
-    if 'ERROR' in record:
-        raise Exception()
+def kill_job(job_id, record, exit_reason, out=None):
+    out = sys.stdout if out is None else out
 
-    max_mem = record['MAX_MEM']
-    if max_mem == "":
-        return
-    assert max_mem.endswith('Gbytes'), max_mem
-    max_mem = max_mem.replace(' Gbytes', '')
-    max_mem = float(max_mem)
+    cmd = ['bkill', job_id]
+    # logging.info('killing job id: {}'.format(job_id))
+    stdout = subprocess.check_output(cmd).decode()
+    print(stdout, file=out)
 
-    requested_mem = record['MEMLIMIT']
-    if requested_mem == "":
-        return
-    assert requested_mem.endswith('G'), max_mem
-    requested_mem = requested_mem.replace(' G', '')
-    requested_mem = float(requested_mem)
+    record_exit_accounting(record, exit_reason=exit_reason)
+    create_rc_file_on_fail(record)
+
+
+def _is_hung_on_memory(record, samples, num_samples=3, min_cpu_fraction=0.05):
+    """
+    job is hung if its current memory stayed at the limit and the job used
+    less than min_cpu_fraction of its slots over the last num_samples samples.
+    max mem is a peak and stays at the limit once the job touched it, so
+    it cannot tell a hung job from one in a low cpu (e.g. io bound) phase
+    """
+    requested_mem = record.requested_mem
 
-    cpu = record['SLOTS']
-    if cpu == "":
-        return
-    cpu = int(cpu)
-    requested_mem = requested_mem * cpu
+    if requested_mem is None or record.slots is None or len(samples) < num_samples:
+        return False
 
-    if max_mem >= (requested_mem - 1):
-        return True
+    window = samples[-num_samples:]
+
+    for sample in window:
+        # samples written before mem was recorded have no mem
+        if sample.get('mem') is None or sample['mem'] < requested_mem - 1:
+            return False
 
+    first, last = window[0], window[-1]
+    if first['cpu_used'] is None or last['cpu_used'] is None:
+        return False
 
-def get_job_status(job_id):
-    cmd = ['bjobs', '-o', 'STAT:6', '-json', job_id]
-    stdout = subprocess.check_output(cmd).decode()
-    stdout = json.loads(stdout)
-    assert stdout['JOBS'] == 1
-    record = stdout['RECORDS'][0]
-    if 'ERROR' in record:
-        raise Exception()
-    status = record['STAT']
+    elapsed = last['time'] - first['time']
+    if elapsed <= 0:
+        return False
 
-    return status
+    cpu_fraction = (last['cpu_used'] - first['cpu_used']) / (elapsed * record.slots)
 
+    return cpu_fraction < min_cpu_fraction
 
-def check_alive(job_id, kill_hung_jobs=False):
-    status = get_job_status(job_id)
 
-    if status in ['PEND', 'WAIT', 'PROV', 'RUN']:
-        print(status)
+def get_job_record(job_id, snapshot):
+    return snapshot.get_record(job_id)
 
-    # 1 in 5 chance that we query and kill job
-    # to lower load on LSF
-    check_hung = random.randint(1, 5) == 5
-    if kill_hung_jobs and status == 'RUN' and check_hung:
-        if _is_mem_usage_high(job_id):
-            kill_job(job_id)
-            return
 
-    # if we print nothing, cromwell assumes job finished
-    if 'SUSP' in status or status == 'EXIT':
-        create_rc_file_on_fail(job_id)
+def _is_stalled(job_samples, stall_window_mins=120):
+    """
+    job is stalled if it made no cpu progress for stall_window_mins of run time,
+    e.g. blocked on a dead mount or deadlocked
+    """
+    return job_samples.idle_run_time() >= stall_window_mins * 60
+
+
+def _is_near_run_limit(record, margin_mins=30):
+    if record.run_limit is None or record.run_time is None:
+        return False
+    return record.run_limit - record.run_time <= margin_mins * 60
+
+
+def extend_walltime(job_id, record, max_walltime_hrs, out=None):
+    """
+    double the run limit of a running job in place with bmod -W, capped at
+    max_walltime_hrs. returns the new walltime or None if the job is at the cap
+    or bmod fails
+    """
+    out = sys.stdout if out is None else out
+
+    try:
+        job_info = retrieve_job_information(record.exec_cwd)
+    except FileNotFoundError:
+        # submitted without generate_bsub_command, e.g. the runner's cleanup task
+        job_info = None
+
+    old_mins = int(record.run_limit // 60)
+    # the snapshot can predate an extension made by an earlier check
+    if job_info is not None and walltime_to_minutes(job_info['walltime']) > old_mins:
+        return None
+
+    new_mins = min(old_mins * 2, max_walltime_hrs * 60)
+    if new_mins <= old_mins:
+        return None
+
+    walltime = minutes_to_walltime(new_mins)
+
+    cmd = ['bmod', '-W', walltime, job_id]
+    try:
+        stdout = subprocess.check_output(cmd, stderr=subprocess.PIPE).decode()
+    except subprocess.CalledProcessError as e:
+        # e.g. the job finished or the queue caps the run limit, cromwell reads
+        # the job status from stdout so the error goes to stderr
+        print(
+            'bmod failed for job {}: {}'.format(job_id, e.stderr.decode().strip()),
+            file=sys.stderr
+        )
+        return None
+    print(stdout, file=out)
+
+    if job_info is None:
+        return walltime
+
+    # retries start from the extended walltime
+    extensions = job_info.get('walltime_extensions', [])
+    extensions.append({
+        'time': time.time(), 'run_time': record.run_time,
+        'old_walltime': minutes_to_walltime(old_mins), 'new_walltime': walltime
+    })
+    update_job_information(
+        record.exec_cwd, {'walltime': walltime, 'walltime_extensions': extensions}
+    )
+
+    return walltime
+
+
+def check_alive(
+        job_id, kill_hung_jobs=False, state_dir=None, snapshot_ttl=30,
+        hung_job_samples=3, kill_stalled_jobs=False, stall_window_mins=120,
+        job_group=None, extend_walltime_hrs=None, walltime_margin_mins=30,
+        snapshot=None, out=None
+):
+    out = sys.stdout if out is None else out
+
+    if snapshot is None:
+        snapshot = JobSnapshot(state_dir=state_dir, ttl=snapshot_ttl, job_group=job_group)
+
+    record = get_job_record(job_id, snapshot)
+    status = record.status
+
+    # PSUSP is a job held at submission (bsub -H), queued until the runner releases it
+    if status in ['PEND', 'PSUSP', 'WAIT', 'PROV', 'RUN']:
+        print(status, file=out)
+
+    if kill_hung_jobs or kill_stalled_jobs or extend_walltime_hrs is not None:
+        job_samples = JobSamples(job_id, state_dir=state_dir)
+
+        if status == 'RUN':
+            samples = job_samples.append(record)
+
+            hung = kill_hung_jobs and _is_hung_on_memory(
+                record, samples, num_samples=hung_job_samples
+            )
+            stalled = kill_stalled_jobs and _is_stalled(
+                job_samples, stall_window_mins=stall_window_mins
+            )
+
+            if hung or stalled:
+                job_samples.remove()
+                kill_job(
+                    job_id, record, KILLED_HUNG_ON_MEMORY if hung else KILLED_STALLED, out=out
+                )
+                return
+
+            # the last sample interval made cpu progress, the job is slow not stuck
+            progressing = len(samples) > 1 and job_samples.idle_since is None
+            if extend_walltime_hrs is not None and progressing and \
+                    _is_near_run_limit(record, margin_mins=walltime_margin_mins):
+                extend_walltime(job_id, record, extend_walltime_hrs, out=out)
+        elif status in ['DONE', 'EXIT']:
+            job_samples.remove()
+
+    if status in ['DONE', 'EXIT']:
+        record_exit_accounting(record)
+
+    # if we print nothing, cromwell assumes job finished. a job that
+    # never started has no call dir to write the rc file to
+    if status in ['USUSP', 'SSUSP', 'EXIT'] and record.exec_cwd is not None:
+        create_rc_file_on_fail(record)
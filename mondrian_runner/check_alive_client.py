@@ -0,0 +1,52 @@
+import json
+import socket
+import sys
+
+
+class CheckAliveServerError(Exception):
+    pass
+
+
+def forward_check_alive(
+        socket_path, job_id, kill_hung_jobs=False, kill_stalled_jobs=False, job_group=None,
+        timeout=60
+):
+    """
+    send a check_alive request to a running check_alive_server
+    and print its output. returns False if the server is not reachable
+    or does not answer within timeout seconds
+    :param socket_path: unix socket the server is listening on
+    :type socket_path: str
+    """
+    request = {
+        'job_id': job_id, 'kill_hung_jobs': kill_hung_jobs,
+        'kill_stalled_jobs': kill_stalled_jobs, 'job_group': job_group
+    }
+    request = json.dumps(request) + '\n'
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(socket_path)
+        client.sendall(request.encode())
+
+        response = []
+        while True:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            response.append(chunk)
+    except OSError:
+        # no server, or a busy or hung one (socket.timeout is an OSError)
+        return False
+    finally:
+        client.close()
+
+    status, _, output = b''.join(response).decode().partition('\n')
+
+    if status != 'OK':
+        raise CheckAliveServerError(output)
+
+    sys.stdout.write(output)
+
+    return True
@@ -0,0 +1,143 @@
+import io
+import json
+import logging
+import os
+import signal
+import socketserver
+import sys
+import threading
+import traceback
+
+from mondrian_runner.check_alive import check_alive
+from mondrian_runner.lsf import JobSnapshot
+from mondrian_runner.state import get_state_dir
+
+
+def get_socket_path(state_dir=None):
+    return os.path.join(get_state_dir(state_dir), 'check_alive.sock')
+
+
+class CheckAliveHandler(socketserver.StreamRequestHandler):
+    """
+    reads one json request per connection and replies with a status line
+    (OK or ERROR) followed by the check_alive output
+    """
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode())
+
+        out = io.StringIO()
+        try:
+            check_alive(
+                request['job_id'], kill_hung_jobs=request.get('kill_hung_jobs', False),
+                state_dir=self.server.state_dir,
+                hung_job_samples=self.server.hung_job_samples,
+                kill_stalled_jobs=request.get('kill_stalled_jobs', False),
+                stall_window_mins=self.server.stall_window_mins,
+                extend_walltime_hrs=self.server.extend_walltime_hrs,
+                walltime_margin_mins=self.server.walltime_margin_mins,
+                snapshot=self.server.get_snapshot(request.get('job_group')), out=out
+            )
+            response = 'OK\n' + out.getvalue()
+        except Exception:
+            logging.getLogger('mondrian_runner.check_alive_server').exception(
+                'check_alive failed for job {}'.format(request['job_id'])
+            )
+            response = 'ERROR\n' + traceback.format_exc()
+
+        self.wfile.write(response.encode())
+
+
+class CheckAliveServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+            self, socket_path, state_dir=None, snapshot_ttl=30, hung_job_samples=3,
+            stall_window_mins=120, usage_db=None, extend_walltime_hrs=None,
+            walltime_margin_mins=30
+    ):
+        self.snapshot_ttl = snapshot_ttl
+        self.snapshots = {}
+        self._snapshots_lock = threading.Lock()
+        self._stop_recording = threading.Event()
+        self.extend_walltime_hrs = extend_walltime_hrs
+        self.walltime_margin_mins = walltime_margin_mins
+        self.usage_db = usage_db
+        self.state_dir = state_dir
+        self.hung_job_samples = hung_job_samples
+        self.stall_window_mins = stall_window_mins
+        super(CheckAliveServer, self).__init__(socket_path, CheckAliveHandler)
+
+    def get_snapshot(self, job_group=None):
+        """
+        one snapshot per job group, shared by all requests for that group
+        """
+        with self._snapshots_lock:
+            if job_group not in self.snapshots:
+                self.snapshots[job_group] = JobSnapshot(
+                    state_dir=self.state_dir, ttl=self.snapshot_ttl, job_group=job_group
+                )
+            return self.snapshots[job_group]
+
+    def record_usage(self, interval):
+        """
+        write the usage of all jobs in the snapshots to the usage db once per
+        interval, instead of one db write per check
+        """
+        # imported here, sqlite is only needed with --usage_db
+        from mondrian_runner.usage_history import record_snapshot_usage
+
+        while not self._stop_recording.wait(interval):
+            with self._snapshots_lock:
+                snapshots = list(self.snapshots.values())
+            if not snapshots:
+                continue
+
+            try:
+                records = {}
+                for snapshot in snapshots:
+                    records.update(snapshot.get_records())
+                record_snapshot_usage(self.usage_db, records)
+            except Exception:
+                logging.getLogger('mondrian_runner.check_alive_server').exception(
+                    'failed to record usage'
+                )
+
+
+def check_alive_server(
+        socket_path=None, state_dir=None, snapshot_ttl=30, hung_job_samples=3,
+        stall_window_mins=120, usage_db=None, extend_walltime_hrs=None,
+        walltime_margin_mins=30
+):
+    if socket_path is None:
+        socket_path = get_socket_path(state_dir)
+
+    # left behind by a server that did not shut down cleanly
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    logging.getLogger('mondrian_runner.check_alive_server').info(
+        'listening on {}'.format(socket_path)
+    )
+
+    # exit through the finally block below so the socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    server = CheckAliveServer(
+        socket_path, state_dir=state_dir, snapshot_ttl=snapshot_ttl,
+        hung_job_samples=hung_job_samples,
+        stall_window_mins=stall_window_mins, usage_db=usage_db,
+        extend_walltime_hrs=extend_walltime_hrs, walltime_margin_mins=walltime_margin_mins
+    )
+    if usage_db is not None:
+        recorder = threading.Thread(
+            target=server.record_usage, args=(max(snapshot_ttl, 30),), daemon=True
+        )
+        recorder.start()
+
+    try:
+        server.serve_forever()
+    finally:
+        server._stop_recording.set()
+        server.server_close()
+        os.remove(socket_path)
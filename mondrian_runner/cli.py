@@ -82,6 +82,101 @@ def parse_args():
         default=False,
         help='server url'
     )
+    run.add_argument(
+        "--usage_db",
+        help='sqlite db of past resource usage per task, updated with final usage once the run ends'
+    )
+    run.add_argument(
+        "--max_pending", type=int,
+        help='release jobs submitted held by generate_bsub_command --max_pending '
+             'while fewer than this many jobs of the workflow are pending'
+    )
+    run.add_argument(
+        "--job_group_root",
+        help='create an lsf job group <root>/<run id> for the workflow, '
+             'use with generate_bsub_command --job_group_root'
+    )
+    run.add_argument(
+        "--job_group_limit", type=int,
+        help='max running jobs in the workflow job group'
+    )
+    run.add_argument(
+        "--critical_path_priority", default=False, action='store_true',
+        help='write lsf priorities per call from the critical path of the wdl call graph, '
+             'weighted by past run times from --usage_db if given'
+    )
+    run.add_argument(
+        "--state_dir",
+        help='dir for the call priorities and bjobs snapshot, must be the '
+             'generate_bsub_command --state_dir of the cromwell server, which reads them'
+    )
+
+    run_batch = subparsers.add_parser("run_batch")
+    run_batch.set_defaults(which='run_batch')
+    run_batch.add_argument(
+        "--wdl_file",
+        required=True,
+        help='pipeline wdl'
+    )
+    run_batch.add_argument(
+        "--manifest",
+        required=True,
+        help='tsv (csv with a .csv extension) with sample, input_json, options_json and cache_dir columns'
+    )
+    run_batch.add_argument(
+        "--imports",
+        help='zip of wdl imports'
+    )
+    run_batch.add_argument(
+        "--server_url",
+        required=True,
+        help='server url'
+    )
+    run_batch.add_argument(
+        "--mondrian_dir",
+        required=True,
+        help='cromwell root dir with cromwell-executions and cromwell-workflow-logs'
+    )
+    run_batch.add_argument(
+        "--max_in_flight", type=int, default=20,
+        help='max workflows submitted or running at a time'
+    )
+    run_batch.add_argument(
+        "--delete_intermediates",
+        action='store_true',
+        default=False,
+    )
+    run_batch.add_argument(
+        "--try_reattach",
+        action='store_true',
+        default=False,
+    )
+    run_batch.add_argument(
+        "--poll_interval", type=int, default=30,
+        help='seconds between batched status queries while workflows are active'
+    )
+    run_batch.add_argument(
+        "--max_poll_interval", type=int, default=300,
+        help='ceiling for the status query interval while nothing changes'
+    )
+    run_batch.add_argument(
+        "--max_pending", type=int,
+        help='release jobs submitted held by generate_bsub_command --max_pending '
+             'while fewer than this many jobs of each workflow are pending, required '
+             'if the cromwell server submits with --max_pending'
+    )
+    run_batch.add_argument(
+        "--state_dir",
+        help='dir for the bjobs snapshot, as generate_bsub_command --state_dir'
+    )
+    run_batch.add_argument(
+        "--summary",
+        help='also write the summary table to this file'
+    )
+    run_batch.add_argument(
+        "--log_level",
+        default='INFO',
+    )
 
     local_run = subparsers.add_parser("local_run")
     local_run.set_defaults(which='local_run')
@@ -130,6 +225,38 @@ def parse_args():
         help='server url'
     )
 
+    monitor = subparsers.add_parser("monitor")
+    monitor.set_defaults(which='monitor')
+    monitor.add_argument(
+        "--server_url",
+        required=True,
+        help='server url'
+    )
+    monitor.add_argument(
+        "--run_ids", nargs='*', default=[],
+        help='workflow run ids to follow'
+    )
+    monitor.add_argument(
+        "--cache_dirs", nargs='*', default=[],
+        help='follow the latest run id of each of these runner cache dirs'
+    )
+    monitor.add_argument(
+        "--mondrian_dir",
+        help='tail the workflow logs under <mondrian_dir>/cromwell-workflow-logs'
+    )
+    monitor.add_argument(
+        "--poll_interval", type=int, default=30,
+        help='seconds between batched status queries while workflows are active'
+    )
+    monitor.add_argument(
+        "--max_poll_interval", type=int, default=300,
+        help='ceiling for the status query interval while nothing changes'
+    )
+    monitor.add_argument(
+        "--log_level",
+        default='INFO',
+    )
+
     generate_bsub_command = subparsers.add_parser("generate_bsub_command")
     generate_bsub_command.set_defaults(which='generate_bsub_command')
     generate_bsub_command.add_argument(
@@ -184,6 +311,101 @@ def parse_args():
     generate_bsub_command.add_argument(
         "--lsf_extra_args",
     )
+    generate_bsub_command.add_argument(
+        "--headroom", type=float, default=1.5,
+        help='size retries as the usage observed in the previous attempt times this factor, '
+             'falls back to --multiplier if lsf no longer reports the previous attempt'
+    )
+    generate_bsub_command.add_argument(
+        "--usage_db",
+        help='sqlite db of past resource usage per task, requests are recorded here'
+    )
+    generate_bsub_command.add_argument(
+        "--right_size", default=False, action='store_true',
+        help='size first attempts from past usage of the task in --usage_db'
+    )
+    generate_bsub_command.add_argument(
+        "--array_batch_window", type=float,
+        help='collect submissions of a workflow with the same resource request for this many '
+             'seconds and submit them as one lsf job array'
+    )
+    generate_bsub_command.add_argument(
+        "--state_dir",
+        help='dir for state shared between generate_bsub_command calls'
+    )
+    generate_bsub_command.add_argument(
+        "--submit_rate", type=float,
+        help='max bsub calls per second across all generate_bsub_command calls on this host'
+    )
+    generate_bsub_command.add_argument(
+        "--submit_burst", type=int, default=10,
+        help='bsub calls allowed in a burst above --submit_rate'
+    )
+    generate_bsub_command.add_argument(
+        "--submit_retries", type=int, default=3,
+        help='retries for failed bsub calls, with jittered exponential backoff'
+    )
+    generate_bsub_command.add_argument(
+        "--max_pending", type=int,
+        help='submit held (bsub -H) once the workflow has this many jobs pending, '
+             'run --max_pending releases them'
+    )
+    generate_bsub_command.add_argument(
+        "--critical_path_priority", default=False, action='store_true',
+        help='submit with the user priority (bsub -sp) written by run --critical_path_priority, '
+             'run --state_dir must match --state_dir here'
+    )
+    generate_bsub_command.add_argument(
+        "--scratch", default=False, action='store_true',
+        help='run the task with its working dir on node local scratch ($TMPDIR) '
+             'and copy the execution dir back when it ends'
+    )
+    generate_bsub_command.add_argument(
+        "--scratch_gb", type=int,
+        help='local disk to request with --scratch, defaults to twice the input size (min 10)'
+    )
+    generate_bsub_command.add_argument(
+        "--image_cache_dir",
+        help='node local dir (not the per job $TMPDIR) to cache singularity images in, '
+             'tasks run from the cached copy'
+    )
+    generate_bsub_command.add_argument(
+        "--image_cache_gb", type=int, default=50,
+        help='evict least recently used images once the node cache exceeds this size'
+    )
+    generate_bsub_command.add_argument(
+        "--queue_tiers",
+        help='comma separated queue:max_mem:max_walltime_hrs tiers, smallest first. '
+             'retries that outgrow a tier move to the next queue instead of being '
+             'clamped, replaces --max_mem and --max_walltime_hrs'
+    )
+    generate_bsub_command.add_argument(
+        "--host_failure_threshold", type=float,
+        help='exclude hosts from retries once their decayed count of attempts that '
+             'failed on the host (TERM_HOST, TERM_ZOMBIE, TERM_LOAD, TERM_STALLED) '
+             'reaches this value'
+    )
+    generate_bsub_command.add_argument(
+        "--host_failure_half_life_hrs", type=float, default=24,
+        help='half life of host failure counts in hours'
+    )
+    generate_bsub_command.add_argument(
+        "--job_group_root",
+        help='submit into the lsf job group <root>/<workflow id>, '
+             'bsub creates the group if run has not yet'
+    )
+
+    run_task = subparsers.add_parser("run_task")
+    run_task.set_defaults(which='run_task')
+    run_task.add_argument(
+        "--task", required=True
+    )
+
+    run_array_element = subparsers.add_parser("run_array_element")
+    run_array_element.set_defaults(which='run_array_element')
+    run_array_element.add_argument(
+        "--manifest", required=True
+    )
 
     check_alive = subparsers.add_parser("check_alive")
     check_alive.set_defaults(which='check_alive')
@@ -193,6 +415,89 @@ def parse_args():
     check_alive.add_argument(
         "--kill_hung_jobs", default=False, action='store_true'
     )
+    check_alive.add_argument(
+        "--kill_stalled_jobs", default=False, action='store_true',
+        help='kill running jobs that made no cpu progress for --stall_window_mins'
+    )
+    check_alive.add_argument(
+        "--state_dir",
+        help='dir for the bjobs snapshot and job samples shared between check_alive calls'
+    )
+    check_alive.add_argument(
+        "--snapshot_ttl", type=int, default=30,
+        help='max age of the bjobs snapshot in seconds, 0 to query each job directly'
+    )
+    check_alive.add_argument(
+        "--hung_job_samples", type=int, default=3,
+        help='consecutive samples at the memory limit without cpu progress before a job is killed'
+    )
+    check_alive.add_argument(
+        "--stall_window_mins", type=int, default=120,
+        help='minutes of run time without cpu progress before a job counts as stalled'
+    )
+    check_alive.add_argument(
+        "--extend_walltime_hrs", type=int,
+        help='extend running jobs close to their run limit that still make cpu '
+             'progress with bmod -W, up to this many hours'
+    )
+    check_alive.add_argument(
+        "--walltime_margin_mins", type=int, default=30,
+        help='extend jobs within this many minutes of their run limit'
+    )
+    check_alive.add_argument(
+        "--socket",
+        help='forward the check to a check_alive_server listening on this socket, '
+             'checks in process if the server is not reachable. only --job_id, '
+             '--kill_hung_jobs, --kill_stalled_jobs and --job_group are forwarded, '
+             'the other options are taken from the server'
+    )
+    check_alive.add_argument(
+        "--job_group",
+        help='query the snapshot for this lsf job group (including its subgroups, '
+             'e.g. the job group root) instead of all jobs of the user, '
+             'also forwarded to the check_alive_server'
+    )
+
+    check_alive_server = subparsers.add_parser("check_alive_server")
+    check_alive_server.set_defaults(which='check_alive_server')
+    check_alive_server.add_argument(
+        "--socket",
+        help='unix socket to listen on, defaults to check_alive.sock in the state dir'
+    )
+    check_alive_server.add_argument(
+        "--state_dir",
+        help='dir for the bjobs snapshot and job samples shared between check_alive calls'
+    )
+    check_alive_server.add_argument(
+        "--snapshot_ttl", type=int, default=30,
+        help='max age of the bjobs snapshot in seconds, 0 to query each job directly'
+    )
+    check_alive_server.add_argument(
+        "--hung_job_samples", type=int, default=3,
+        help='consecutive samples at the memory limit without cpu progress before a job is killed'
+    )
+    check_alive_server.add_argument(
+        "--stall_window_mins", type=int, default=120,
+        help='minutes of run time without cpu progress before a job counts as stalled'
+    )
+    check_alive_server.add_argument(
+        "--usage_db",
+        help='sqlite db of past resource usage per task, usage of running jobs is recorded '
+             'here in one write per bjobs snapshot'
+    )
+    check_alive_server.add_argument(
+        "--extend_walltime_hrs", type=int,
+        help='extend running jobs close to their run limit that still make cpu '
+             'progress with bmod -W, up to this many hours'
+    )
+    check_alive_server.add_argument(
+        "--walltime_margin_mins", type=int, default=30,
+        help='extend jobs within this many minutes of their run limit'
+    )
+    check_alive_server.add_argument(
+        "--log_level",
+        default='INFO',
+    )
 
     args = vars(parser.parse_args())
 
@@ -0,0 +1,206 @@
+import json
+import os
+import re
+
+from mondrian_runner import utils
+from mondrian_runner.job_groups import get_workflow_id
+from mondrian_runner.state import atomic_write_json
+from mondrian_runner.state import get_state_dir
+from mondrian_runner.usage_history import UsageHistory
+from mondrian_runner.usage_history import percentile
+
+TOKEN_RE = re.compile(
+    r'\bcall\s+([\w.]+)(?:\s+as\s+(\w+))?|\bscatter\s*\(([^)]*)\)|\bif\s*\(([^{]*)\)|\{|\}'
+)
+
+
+def _find_block_end(text, start):
+    """
+    index just past the brace that closes the block opened at text[start]
+    """
+    depth = 0
+    for idx in range(start, len(text)):
+        if text[idx] == '{':
+            depth += 1
+        elif text[idx] == '}':
+            depth -= 1
+            if depth == 0:
+                return idx + 1
+    return len(text)
+
+
+def parse_wdl_calls(wdl_text):
+    """
+    static call graph of the workflow in a wdl file. a call depends on every
+    other call whose outputs it references, in its inputs or in the
+    scatter/if expressions it is nested in. calls into imported subworkflows
+    are single nodes. returns the workflow name and a dict of call name to
+    the set of calls it depends on
+    """
+    wdl_text = re.sub(r'#[^\n]*', '', wdl_text)
+
+    workflow = re.search(r'\bworkflow\s+(\w+)\s*\{', wdl_text)
+    if workflow is None:
+        return None, {}
+    start = workflow.end() - 1
+    body = wdl_text[start + 1:_find_block_end(wdl_text, start) - 1]
+
+    calls = {}
+    headers = []
+    pending_header = ''
+    pos = 0
+    while True:
+        match = TOKEN_RE.search(body, pos)
+        if match is None:
+            break
+        pos = match.end()
+        token = match.group(0)
+
+        if token.startswith('call'):
+            name = match.group(2) or match.group(1).split('.')[-1]
+            text = ''
+            block_start = re.match(r'\s*\{', body[pos:])
+            if block_start is not None:
+                block_end = _find_block_end(body, pos + block_start.end() - 1)
+                text = body[pos:block_end]
+                pos = block_end
+            calls[name] = ' '.join(headers + [text])
+        elif token.startswith('scatter') or token.startswith('if'):
+            pending_header = match.group(3) or match.group(4)
+        elif token == '{':
+            headers.append(pending_header)
+            pending_header = ''
+        elif headers:
+            headers.pop()
+
+    graph = {}
+    for name, text in calls.items():
+        refs = set(re.findall(r'\b(\w+)\.\w+', text))
+        graph[name] = {v for v in refs if v in calls and v != name}
+
+    return workflow.group(1), graph
+
+
+def get_call_weights(graph, wf_name, usage_db=None):
+    """
+    median past run time per call from the usage db, calls without history
+    get the median of the others. all calls weigh 1 without a usage db
+    """
+    weights = {}
+    if usage_db is not None:
+        with UsageHistory(usage_db) as history:
+            for name in graph:
+                usage = history.get_successful_usage('{}.{}'.format(wf_name, name))
+                if usage:
+                    weights[name] = percentile([v[1] for v in usage], 50)
+
+    default = percentile(list(weights.values()), 50) if weights else 1
+    return {name: weights.get(name, default) for name in graph}
+
+
+def _longest_path(name, edges, weights, cache, visiting):
+    """
+    weight of the heaviest chain starting at name and following edges
+    """
+    if name in cache:
+        return cache[name]
+
+    # guard against cycles from references the regex parse got wrong
+    visiting.add(name)
+    following = [
+        _longest_path(v, edges, weights, cache, visiting)
+        for v in edges[name] if v not in visiting
+    ]
+    visiting.remove(name)
+
+    cache[name] = weights[name] + max(following or [0])
+    return cache[name]
+
+
+def get_critical_path(graph, weights):
+    """
+    depth (number of upstream calls on the longest chain into the call) and
+    remaining critical path length (heaviest chain from the call to the end
+    of the workflow, including the call) per call
+    """
+    dependents = {name: set() for name in graph}
+    for name, deps in graph.items():
+        for dep in deps:
+            dependents[dep].add(name)
+
+    depth_cache = {}
+    remaining_cache = {}
+    unit_weights = {name: 1 for name in graph}
+
+    depth = {
+        name: _longest_path(name, graph, unit_weights, depth_cache, set()) - 1
+        for name in graph
+    }
+    remaining = {
+        name: _longest_path(name, dependents, weights, remaining_cache, set())
+        for name in graph
+    }
+
+    return depth, remaining
+
+
+def get_priority_file(run_id, state_dir=None):
+    priority_dir = os.path.join(get_state_dir(state_dir), 'priorities')
+    utils.makedirs(priority_dir)
+    return os.path.join(priority_dir, '{}.json'.format(run_id))
+
+
+def write_call_priorities(
+        run_id, wdl_file, usage_db=None, state_dir=None, min_priority=1, max_priority=100
+):
+    """
+    map each call of the workflow to an lsf user priority (bsub -sp) that
+    scales with its remaining critical path, so calls on the longest chain
+    dispatch ahead of short leaf calls
+    """
+    with open(wdl_file, 'rt') as reader:
+        wf_name, graph = parse_wdl_calls(reader.read())
+
+    if not graph:
+        return
+
+    weights = get_call_weights(graph, wf_name, usage_db=usage_db)
+    depth, remaining = get_critical_path(graph, weights)
+
+    max_remaining = max(remaining.values())
+
+    calls = {}
+    for name in graph:
+        priority = min_priority + (max_priority - min_priority) * remaining[name] / max_remaining
+        calls[name] = {
+            'depth': depth[name], 'remaining': remaining[name], 'priority': int(round(priority))
+        }
+
+    priority_file = get_priority_file(run_id, state_dir=state_dir)
+    atomic_write_json(priority_file, {'workflow': wf_name, 'calls': calls})
+
+
+def get_call_priority(cwd, state_dir=None):
+    """
+    priority of the top level call a cromwell call dir belongs to, tasks of
+    subworkflows inherit the priority of the subworkflow call. None if the
+    runner did not write priorities for the workflow
+    """
+    workflow_id = get_workflow_id(cwd)
+    if workflow_id is None:
+        return None
+
+    parts = cwd.split('/')
+    calls = [v for v in parts[parts.index(workflow_id):] if v.startswith('call-')]
+    if not calls:
+        return None
+
+    priority_file = get_priority_file(workflow_id, state_dir=state_dir)
+    if not os.path.exists(priority_file):
+        return None
+
+    with open(priority_file, 'rt') as reader:
+        priorities = json.load(reader)
+
+    call = priorities['calls'].get(calls[0][len('call-'):])
+    return None if call is None else call['priority']
@@ -0,0 +1,195 @@
+import http.client
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+
+
+class CromwellError(Exception):
+    pass
+
+
+def normalize_server_url(server_url):
+    """
+    cromwell urls are passed with and without scheme, default to http
+    """
+    if '://' not in server_url:
+        server_url = 'http://{}'.format(server_url)
+    return server_url.rstrip('/')
+
+
+def _iter_multipart(parts, boundary, chunk_size=1024 * 1024):
+    for name, path in parts:
+        yield _part_header(name, path, boundary)
+        with open(path, 'rb') as reader:
+            for chunk in iter(lambda: reader.read(chunk_size), b''):
+                yield chunk
+        yield b'\r\n'
+    yield '--{}--\r\n'.format(boundary).encode()
+
+
+def _part_header(name, path, boundary):
+    return (
+        '--{}\r\n'
+        'Content-Disposition: form-data; name="{}"; filename="{}"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n'
+    ).format(boundary, name, os.path.basename(path)).encode()
+
+
+def _multipart_length(parts, boundary):
+    length = len('--{}--\r\n'.format(boundary))
+    for name, path in parts:
+        length += len(_part_header(name, path, boundary)) + os.path.getsize(path) + 2
+    return length
+
+
+class CromwellClient(object):
+    """
+    client for the cromwell rest api on the standard library. keeps one
+    connection open between requests, retries connection errors and 5xx
+    responses with jittered exponential backoff and streams uploaded files.
+    submit and abort are only retried when the server could not be reached
+    """
+
+    def __init__(self, server_url, timeout=60, retries=3, backoff=2):
+        self.server_url = normalize_server_url(server_url)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        url = urllib.parse.urlsplit(self.server_url)
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.base_path = url.path
+
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _request(self, method, path, body=None, headers=None, idempotent=True):
+        """
+        returns the decoded json response. body can be a callable returning a
+        fresh iterable of bytes, so a streamed upload can be retried. requests
+        that are not idempotent are only retried if the connection could not
+        be opened, once sent the server may have acted on them
+        """
+        headers = dict(headers or {})
+        headers.setdefault('Accept', 'application/json')
+
+        attempt = 0
+        while True:
+            sent = False
+            try:
+                with self._lock:
+                    # a kept alive connection the server has since closed only fails
+                    # once the request is sent, so those requests get a new one
+                    if self._conn is not None and not idempotent:
+                        self._conn.close()
+                        self._conn = None
+                    if self._conn is None:
+                        conn = self._connect()
+                        conn.connect()
+                        self._conn = conn
+                    try:
+                        sent = True
+                        self._conn.request(
+                            method, self.base_path + path,
+                            body=body() if callable(body) else body, headers=headers
+                        )
+                        response = self._conn.getresponse()
+                        data = response.read()
+                    except Exception:
+                        # the server may have closed the kept alive connection
+                        self._conn.close()
+                        self._conn = None
+                        raise
+
+                if response.status >= 500:
+                    raise CromwellError('{} {} returned {}: {}'.format(
+                        method, path, response.status, data.decode(errors='replace')
+                    ))
+            except (OSError, http.client.HTTPException, CromwellError) as e:
+                if attempt == self.retries or (sent and not idempotent):
+                    raise
+                sleep = self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+                logging.getLogger('mondrian_runner.cromwell').warning(
+                    '{} {} failed ({}), retrying in {:.1f}s'.format(method, path, e, sleep)
+                )
+                time.sleep(sleep)
+                attempt += 1
+                continue
+
+            if response.status >= 400:
+                raise CromwellError('{} {} returned {}: {}'.format(
+                    method, path, response.status, data.decode(errors='replace')
+                ))
+
+            return json.loads(data)
+
+    def submit(self, wdl_file, input_json=None, options_json=None, imports=None):
+        """
+        submit a workflow, returns the run id
+        """
+        parts = [('workflowSource', wdl_file)]
+        if input_json is not None:
+            parts.append(('workflowInputs', input_json))
+        if options_json is not None:
+            parts.append(('workflowOptions', options_json))
+        if imports is not None:
+            parts.append(('workflowDependencies', imports))
+
+        boundary = uuid.uuid4().hex
+        headers = {
+            'Content-Type': 'multipart/form-data; boundary={}'.format(boundary),
+            'Content-Length': str(_multipart_length(parts, boundary)),
+        }
+
+        # a retried submission could start the workflow twice
+        response = self._request(
+            'POST', '/api/workflows/v1',
+            body=lambda: _iter_multipart(parts, boundary), headers=headers, idempotent=False
+        )
+
+        if 'id' not in response:
+            raise CromwellError('unable to parse id: {}'.format(response))
+
+        return response['id']
+
+    def query(self, run_ids):
+        """
+        query results for a list of run ids in one request
+        """
+        params = urllib.parse.urlencode([('id', v) for v in run_ids])
+        return self._request('GET', '/api/workflows/v1/query?{}'.format(params))
+
+    def abort(self, run_id):
+        return self._request(
+            'POST', '/api/workflows/v1/{}/abort'.format(run_id), idempotent=False
+        )
+
+
+_clients = {}
+
+
+def get_client(server_url):
+    """
+    one client per server for the life of the process so polls reuse the connection
+    """
+    server_url = normalize_server_url(server_url)
+    if server_url not in _clients:
+        _clients[server_url] = CromwellClient(server_url)
+    return _clients[server_url]
@@ -1,6 +1,33 @@
-import json
-import os
-import subprocess
+import math
+
+from mondrian_runner.job_groups import get_job_group
+from mondrian_runner.job_groups import get_workflow_id
+from mondrian_runner.job_info import cache_job_information
+from mondrian_runner.job_info import minutes_to_walltime
+from mondrian_runner.job_info import retrieve_job_information
+from mondrian_runner.job_info import walltime_to_minutes
+from mondrian_runner.lsf import JobNotFoundError
+from mondrian_runner.lsf import JobRecord
+from mondrian_runner.lsf import query_job
+from mondrian_runner.lsf import query_job_history
+from mondrian_runner.submit_limiter import SubmitLimiter
+from mondrian_runner.submit_limiter import run_bsub
+
+
+def get_container_cmd(cwd, docker_cwd, bind_mounts, singularity_img, job_shell, docker_script):
+    cmd = [
+        "singularity", "exec", "--containall", "--bind",
+        "{}:{}".format(cwd, docker_cwd)
+    ]
+
+    for mount in bind_mounts:
+        cmd.extend(['--bind', mount])
+
+    cmd += [
+        singularity_img, job_shell, docker_script
+    ]
+
+    return [str(v) for v in cmd]
 
 
 def submit_job(
@@ -8,34 +35,80 @@ def submit_job(
         cwd, out, err, lsf_extra_args,
         docker_cwd, bind_mounts,
         singularity_img, job_shell,
-        docker_script
+        docker_script, array_batch_window=None, state_dir=None,
+        limiter=None, submit_retries=3, hold=False, job_group=None, exclude_hosts=None,
+        queue=None, priority=None, scratch_gb=None, image_cache_dir=None, image_cache_gb=50
 ):
-    cmd = [
-        "bsub", "-n", cpu, "-W", walltime,
-        "-R", "'rusage[mem={}]span[ptile={}]'".format(memory_gb, cpu),
-        "-J", job_name, "-cwd", cwd, "-o", out, "-e", err
+    select = ''
+    if exclude_hosts:
+        select = 'select[{}] '.format(' && '.join('hname!={}'.format(v) for v in exclude_hosts))
+
+    # lsf tmp is in MB and, like mem, per slot
+    tmp = ''
+    if scratch_gb is not None:
+        tmp = ':tmp={}'.format(int(math.ceil(scratch_gb * 1024.0 / cpu)))
+
+    resource_args = [
+        "-n", cpu, "-W", walltime,
+        "-R", "'{}rusage[mem={}{}]span[ptile={}]'".format(select, memory_gb, tmp, cpu),
     ]
 
+    if queue is not None:
+        resource_args.extend(["-q", queue])
+
+    if priority is not None:
+        resource_args.extend(["-sp", priority])
+
+    if job_group is not None:
+        resource_args.extend(["-g", job_group])
+
+    if hold:
+        resource_args.append("-H")
+
+    extra_args = []
     if lsf_extra_args is not None:
-        cmd.extend(lsf_extra_args.split())
+        extra_args = lsf_extra_args.split()
 
-    cmd += [
-        "--wrap", "singularity", "exec", "--containall", "--bind",
-        "{}:{}".format(cwd, docker_cwd)
-    ]
+    container_cmd = get_container_cmd(
+        cwd, docker_cwd, bind_mounts, singularity_img, job_shell, docker_script
+    )
 
-    for mount in bind_mounts:
-        cmd.extend(['--bind', mount])
+    if scratch_gb is not None or image_cache_dir is not None:
+        # cromwell runs this once per job, modules of optional features
+        # are imported where the feature is used to keep startup fast
+        from mondrian_runner.task_wrapper import write_task
 
-    cmd += [
-        singularity_img, job_shell, docker_script
-    ]
+        container_cmd = write_task(
+            cwd, docker_cwd, container_cmd, singularity_img, scratch=scratch_gb is not None,
+            image_cache_dir=image_cache_dir, image_cache_gb=image_cache_gb
+        )
+
+    if array_batch_window is not None:
+        from mondrian_runner.job_array import submit_batched
+
+        element = {'cwd': cwd, 'out': out, 'err': err, 'job_name': job_name, 'cmd': container_cmd}
+        job_id = submit_batched(
+            [str(v) for v in resource_args + extra_args], element,
+            window=array_batch_window, state_dir=state_dir,
+            limiter=limiter, submit_retries=submit_retries
+        )
+        # same format as bsub so the cromwell job-id-regex matches
+        print('Job <{}> is submitted as a job array element.'.format(job_id))
+    else:
+        cmd = ["bsub"] + resource_args + ["-J", job_name, "-cwd", cwd, "-o", out, "-e", err]
+        cmd += extra_args
+        cmd += ["--wrap"] + container_cmd
+
+        stdout = run_bsub(cmd, job_name, limiter=limiter, retries=submit_retries)
+        print(stdout)
+
+        job_id = find_job_id(stdout)
+
+    if hold:
+        from mondrian_runner.hold_release import record_held_job
 
-    cmd = [str(v) for v in cmd]
-    stdout = subprocess.check_output(cmd).decode()
-    print(stdout)
+        record_held_job(job_name, job_id, cwd, state_dir=state_dir)
 
-    job_id = find_job_id(stdout)
     return job_id
 
 
@@ -65,26 +138,76 @@ def find_job_id(stdout):
     return jobid
 
 
-def get_job_failure_reason(job_id):
-    cmd = ['bjobs', '-o', 'EXIT_REASON:50', '-json', job_id]
-    stdout = subprocess.check_output(cmd).decode()
-    stdout = json.loads(stdout)
-    assert stdout['JOBS'] == 1
-    if 'ERROR' in stdout['RECORDS'][0]:
-        return 'UNKNOWN'
-    reason = stdout['RECORDS'][0]['EXIT_REASON']
-    return reason
+def get_job_record(job_id):
+    try:
+        return JobRecord(query_job(job_id))
+    except JobNotFoundError:
+        # lsf has already purged the job
+        return None
+
+
+def get_job_accounting(job_info):
+    """
+    exit reason, peak memory (GB), run time (seconds) and first execution host of a
+    finished attempt. check_alive records these in job_information.json when it sees
+    the job end, otherwise lsf is queried, falling back to bhist/bacct once bjobs has
+    purged the job
+    """
+    if 'exit_reason' in job_info:
+        return (
+            job_info['exit_reason'], job_info.get('max_mem'), job_info.get('run_time'),
+            job_info.get('exec_host')
+        )
+
+    record = get_job_record(job_info['job_id'])
+    if record is not None:
+        exec_host = record.exec_hosts[0] if record.exec_hosts else None
+        return record.exit_reason or '', record.max_mem, record.run_time, exec_host
+
+    history = query_job_history([job_info['job_id']])
+    if job_info['job_id'] in history:
+        history = history[job_info['job_id']]
+        return (
+            history['exit_reason'], history['max_mem'], history['run_time'],
+            history['exec_host']
+        )
+
+    return 'UNKNOWN', None, None, None
+
+
+# exit reasons that point at the execution host rather than the task,
+# the job's own errors, owner/admin kills and preemption do not count
+HOST_EXIT_REASONS = ['TERM_HOST', 'TERM_ZOMBIE', 'TERM_LOAD', 'TERM_STALLED']
+
+
+def is_host_failure(fail_reason):
+    return any(v in fail_reason for v in HOST_EXIT_REASONS)
+
+
+def update_host_failures(
+        job_id, fail_reason, exec_host, state_dir=None, threshold=2, half_life_hrs=24
+):
+    """
+    count the previous attempt against its host if its exit reason points at
+    the host, returns the hosts to exclude from the retry
+    """
+    from mondrian_runner.host_failures import HostFailures
+
+    host_failures = HostFailures(state_dir=state_dir, half_life_hrs=half_life_hrs)
+
+    if exec_host is not None and is_host_failure(fail_reason):
+        host_failures.record_failure(exec_host, job_id)
+
+    return host_failures.get_excluded_hosts(threshold)
 
 
 def update_walltime(walltime, multiplier, max_walltime_hrs=None):
-    hours, mins = walltime.split(':')
-    hours = int(hours) * multiplier
-    mins = int(mins) * multiplier
+    minutes = walltime_to_minutes(walltime) * multiplier
     # job time limit as imposed by the cluster
-    if max_walltime_hrs is not None and hours > max_walltime_hrs:
+    if max_walltime_hrs is not None and minutes > max_walltime_hrs * 60:
         walltime = "{}:00".format(max_walltime_hrs)
     else:
-        walltime = '{}:{:02d}'.format(hours, mins)
+        walltime = minutes_to_walltime(minutes)
     return walltime
 
 
@@ -97,20 +220,157 @@ def update_memory(memory_gb, cpu, multiplier, max_mem=None):
     return memory_gb
 
 
+def parse_queue_tiers(queue_tiers):
+    """
+    parse queue:max_mem:max_walltime_hrs,... ordered from the smallest tier up
+    :param queue_tiers: comma separated tiers, max_mem in GB per job
+    :type queue_tiers: str
+    """
+    tiers = []
+    for tier in queue_tiers.split(','):
+        queue, max_mem, max_walltime_hrs = tier.split(':')
+        tiers.append((queue, int(max_mem), int(max_walltime_hrs)))
+    return tiers
+
+
+def select_queue_tier(tiers, walltime, memory_gb, cpu, min_tier=0):
+    """
+    first tier from min_tier up whose caps fit the request, the request is
+    clamped to the largest tier if none does. returns the tier index,
+    walltime and memory per cpu
+    """
+    for idx in range(min_tier, len(tiers)):
+        queue, max_mem, max_walltime_hrs = tiers[idx]
+        if int(memory_gb) * cpu <= max_mem and walltime_to_minutes(walltime) <= max_walltime_hrs * 60:
+            return idx, walltime, memory_gb
+
+    idx = len(tiers) - 1
+    queue, max_mem, max_walltime_hrs = tiers[idx]
+    walltime = update_walltime(walltime, 1, max_walltime_hrs=max_walltime_hrs)
+    memory_gb = update_memory(memory_gb, cpu, 1, max_mem=max_mem)
+    return idx, walltime, memory_gb
+
+
+def size_walltime(walltime, headroom, run_time, max_walltime_hrs=None):
+    """
+    size walltime from the run time (seconds) observed in the previous attempt,
+    never below the previous request
+    """
+    minutes = max(walltime_to_minutes(walltime), run_time / 60)
+    minutes = int(math.ceil(minutes * headroom))
+
+    if max_walltime_hrs is not None and minutes > max_walltime_hrs * 60:
+        minutes = max_walltime_hrs * 60
+
+    return minutes_to_walltime(minutes)
+
+
+def size_memory(memory_gb, cpu, headroom, peak_mem, max_mem=None):
+    """
+    size per cpu memory from the peak memory (GB, all slots) observed in the
+    previous attempt, never below the previous request
+    """
+    memory_gb = max(int(memory_gb), peak_mem / cpu)
+    memory_gb = int(math.ceil(memory_gb * headroom))
+
+    if max_mem is not None and memory_gb * cpu > max_mem:
+        memory_gb = max_mem // cpu
+
+    return memory_gb
+
+
+# what a retry escalates, by the exit reason of the previous attempt
+RESUBMIT = 'resubmit'
+ESCALATE_MEMORY = 'memory'
+ESCALATE_WALLTIME = 'walltime'
+ESCALATE_BOTH = 'both'
+
+# checked in order, first match wins. host failures, preemption and
+# requeues are not the job's fault and come back at the same size
+EXIT_REASON_POLICY = [
+    ('TERM_RUNLIMIT', ESCALATE_WALLTIME),
+    ('TERM_CPULIMIT', ESCALATE_WALLTIME),
+    ('TERM_MEMLIMIT', ESCALATE_MEMORY),
+    ('TERM_SWAP', ESCALATE_MEMORY),
+    ('TERM_HOST', RESUBMIT),
+    ('TERM_LOAD', RESUBMIT),
+    ('TERM_OWNER', RESUBMIT),
+    ('TERM_ADMIN', RESUBMIT),
+    ('TERM_PREEMPT', RESUBMIT),
+    ('TERM_REQUEUE_', RESUBMIT),
+    ('TERM_ZOMBIE', RESUBMIT),
+    ('TERM_STALLED', RESUBMIT),
+    ('UNKNOWN', ESCALATE_BOTH),
+]
+
+
+def classify_exit_reason(fail_reason):
+    """
+    retry policy for an lsf exit reason, None if the reason does not say
+    which resource ran out (e.g. the task itself exited non zero)
+    """
+    for prefix, policy in EXIT_REASON_POLICY:
+        if prefix in fail_reason:
+            return policy
+    return None
+
+
+def update_resource_requests_from_usage(
+        walltime, memory_gb, cpu, policy, peak_mem, run_time, headroom,
+        max_mem=None, max_walltime_hrs=None, near_limit=0.9
+):
+    """
+    escalate only the resource the previous attempt ran out of,
+    based on the exit reason or on usage that came close to the request
+    """
+    if policy is not None:
+        escalate_walltime = policy in (ESCALATE_WALLTIME, ESCALATE_BOTH)
+        escalate_memory = policy in (ESCALATE_MEMORY, ESCALATE_BOTH)
+    else:
+        escalate_walltime = run_time >= near_limit * walltime_to_minutes(walltime) * 60
+        escalate_memory = peak_mem >= near_limit * int(memory_gb) * cpu
+        # no resource was close to its limit, default to memory as before
+        if not escalate_walltime and not escalate_memory:
+            escalate_memory = True
+
+    if escalate_walltime:
+        walltime = size_walltime(
+            walltime, headroom, run_time, max_walltime_hrs=max_walltime_hrs
+        )
+    if escalate_memory:
+        memory_gb = size_memory(
+            memory_gb, cpu, headroom, peak_mem, max_mem=max_mem
+        )
+
+    return walltime, memory_gb
+
+
 def update_resource_requests(
         walltime, memory_gb, attempt, multiplier, cpu, fail_reason,
-        max_mem=None, max_walltime_hrs=None
+        max_mem=None, max_walltime_hrs=None,
+        peak_mem=None, run_time=None, headroom=None
 ):
+    policy = classify_exit_reason(fail_reason)
+
+    # infrastructure failure, a larger request would only queue longer
+    if policy == RESUBMIT:
+        return walltime, memory_gb
+
+    if headroom is not None and peak_mem is not None and run_time is not None:
+        return update_resource_requests_from_usage(
+            walltime, memory_gb, cpu, policy, peak_mem, run_time, headroom,
+            max_mem=max_mem, max_walltime_hrs=max_walltime_hrs
+        )
 
     # just increase both on second attempt to be conservative
-    if attempt == 2 or fail_reason == 'UNKNOWN':
+    if attempt == 2 or policy == ESCALATE_BOTH:
         walltime = update_walltime(
             walltime, multiplier, max_walltime_hrs=max_walltime_hrs
         )
         memory_gb = update_memory(
             memory_gb, cpu, multiplier, max_mem=max_mem
         )
-    elif 'TERM_RUNLIMIT' in fail_reason:
+    elif policy == ESCALATE_WALLTIME:
         walltime = update_walltime(
             walltime, multiplier, max_walltime_hrs=max_walltime_hrs
         )
@@ -122,61 +382,143 @@ def update_resource_requests(
     return walltime, memory_gb
 
 
-def cache_job_information(job_id, walltime, memory_gb, attempt_number, cwd):
-    cache_file = os.path.join(cwd, 'execution', 'job_information.json')
-    if os.path.exists(cache_file):
-        print('Cannot cache, file exists:{}'.format(cache_file))
+def record_job_request(usage_db, job_id, cwd, cpu, memory_gb, walltime, input_bytes=None):
+    from mondrian_runner.usage_history import UsageHistory
 
-    with open(cache_file, 'wt') as writer:
-        json.dump(
-            {'job_id': job_id, 'walltime': walltime, 'memory_gb': memory_gb,
-             'attempt': attempt_number},
-            writer
+    with UsageHistory(usage_db) as history:
+        history.record_request(
+            job_id, cwd, cpu, memory_gb, walltime, input_bytes=input_bytes
         )
 
 
-def retrieve_job_information(cwd):
-    cache_file = os.path.join(cwd, 'execution', 'job_information.json')
-    with open(cache_file, 'rt') as reader:
-        data = json.load(reader)
-    return data
-
-
 def generate_bsub_command(
         cwd, multiplier, walltime, memory_gb,
         cpu, job_name, out, err, docker_cwd,
         singularity_img, job_shell, docker_script,
         max_mem=None, max_walltime_hrs=None,
-        bind_mounts=None, lsf_extra_args=None
+        bind_mounts=None, lsf_extra_args=None, headroom=None,
+        usage_db=None, right_size=False, array_batch_window=None, state_dir=None,
+        submit_rate=None, submit_burst=10, submit_retries=3, max_pending=None,
+        job_group_root=None, host_failure_threshold=None, host_failure_half_life_hrs=24,
+        queue_tiers=None, critical_path_priority=False, scratch=False, scratch_gb=None,
+        image_cache_dir=None, image_cache_gb=50
 ):
+    if queue_tiers is not None:
+        queue_tiers = parse_queue_tiers(queue_tiers)
+
+    limiter = None
+    if submit_rate is not None:
+        limiter = SubmitLimiter(submit_rate, burst=submit_burst, state_dir=state_dir)
+
+    hold = False
+    if max_pending is not None:
+        from mondrian_runner.hold_release import should_hold
+
+        hold = should_hold(job_name, max_pending, state_dir=state_dir)
+
+    job_group = None
+    workflow_id = get_workflow_id(cwd)
+    if job_group_root is not None and workflow_id is not None:
+        job_group = get_job_group(job_group_root, workflow_id)
+
+    priority = None
+    if critical_path_priority:
+        from mondrian_runner.critical_path import get_call_priority
+
+        priority = get_call_priority(cwd, state_dir=state_dir)
+
+    input_bytes = None
+    if usage_db is not None:
+        from mondrian_runner.usage_history import get_input_size
+
+        input_bytes = get_input_size(cwd)
+
+    if scratch and scratch_gb is None:
+        from mondrian_runner.usage_history import get_input_size
+
+        # room for the outputs and intermediates of a task of this input size
+        scratch_gb = max(10, int(math.ceil(2 * get_input_size(cwd) / 1024.0 ** 3)))
+    elif not scratch:
+        scratch_gb = None
+
     if not is_restart(cwd):
+        if right_size:
+            assert usage_db is not None, 'right sizing requests needs a usage db'
+            from mondrian_runner.usage_history import right_size_request
+
+            memory_gb, walltime_mins = right_size_request(
+                usage_db, cwd, cpu, memory_gb, walltime_to_minutes(walltime),
+                input_bytes=input_bytes, headroom=1.5 if headroom is None else headroom
+            )
+            walltime = minutes_to_walltime(walltime_mins)
+
+        queue = None
+        if queue_tiers is not None:
+            tier, walltime, memory_gb = select_queue_tier(queue_tiers, walltime, memory_gb, cpu)
+            queue = queue_tiers[tier][0]
+
         job_id = submit_job(
             cpu, walltime, memory_gb, job_name,
             cwd, out, err, lsf_extra_args,
             docker_cwd, bind_mounts,
             singularity_img, job_shell,
-            docker_script
+            docker_script, array_batch_window=array_batch_window,
+            state_dir=state_dir, limiter=limiter, submit_retries=submit_retries,
+            hold=hold, job_group=job_group, queue=queue, priority=priority,
+            scratch_gb=scratch_gb, image_cache_dir=image_cache_dir, image_cache_gb=image_cache_gb
         )
-        cache_job_information(job_id, walltime, memory_gb, 1, cwd)
+        cache_job_information(job_id, walltime, memory_gb, 1, cwd, queue=queue)
+        if usage_db is not None:
+            record_job_request(usage_db, job_id, cwd, cpu, memory_gb, walltime, input_bytes=input_bytes)
         return
 
     prev_cwd = get_prev_cwd(cwd)
     prev_job_info = retrieve_job_information(prev_cwd)
-    fail_reason = get_job_failure_reason(prev_job_info['job_id'])
+    fail_reason, peak_mem, run_time, exec_host = get_job_accounting(prev_job_info)
+
+    exclude_hosts = None
+    if host_failure_threshold is not None:
+        exclude_hosts = update_host_failures(
+            prev_job_info['job_id'], fail_reason, exec_host, state_dir=state_dir,
+            threshold=host_failure_threshold, half_life_hrs=host_failure_half_life_hrs
+        )
+
+    # with queue tiers the request is not clamped here, a request that
+    # outgrows the previous queue is promoted to the next tier instead
+    if queue_tiers is not None:
+        max_mem = max_walltime_hrs = None
 
     walltime, memory_gb = update_resource_requests(
         prev_job_info['walltime'], prev_job_info['memory_gb'],
         prev_job_info.get('attempt', 1) + 1, multiplier,
         cpu, fail_reason, max_walltime_hrs=max_walltime_hrs,
-        max_mem=max_mem
+        max_mem=max_mem,
+        peak_mem=peak_mem, run_time=run_time, headroom=headroom
     )
 
+    queue = None
+    if queue_tiers is not None:
+        queues = [v[0] for v in queue_tiers]
+        prev_tier = queues.index(prev_job_info['queue']) if prev_job_info.get('queue') in queues else 0
+        tier, walltime, memory_gb = select_queue_tier(
+            queue_tiers, walltime, memory_gb, cpu, min_tier=prev_tier
+        )
+        queue = queues[tier]
+
     job_id = submit_job(
         cpu, walltime, memory_gb, job_name,
         cwd, out, err, lsf_extra_args,
         docker_cwd, bind_mounts,
         singularity_img, job_shell,
-        docker_script
+        docker_script, array_batch_window=array_batch_window,
+        state_dir=state_dir, limiter=limiter, submit_retries=submit_retries,
+        hold=hold, job_group=job_group, exclude_hosts=exclude_hosts, queue=queue,
+        priority=priority, scratch_gb=scratch_gb, image_cache_dir=image_cache_dir,
+        image_cache_gb=image_cache_gb
     )
 
-    cache_job_information(job_id, walltime, memory_gb, prev_job_info.get('attempt', 1) + 1, cwd)
+    cache_job_information(
+        job_id, walltime, memory_gb, prev_job_info.get('attempt', 1) + 1, cwd, queue=queue
+    )
+    if usage_db is not None:
+        record_job_request(usage_db, job_id, cwd, cpu, memory_gb, walltime, input_bytes=input_bytes)
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+
+from mondrian_runner.lsf import JobSnapshot
+from mondrian_runner.state import atomic_write_json
+from mondrian_runner.state import get_state_dir
+
+QUEUED_STATUSES = ['PEND', 'PSUSP']
+
+
+def get_workflow_job_prefix(run_id):
+    """
+    cromwell names lsf jobs cromwell_<first 8 chars of the workflow id>_<call>
+    """
+    return 'cromwell_{}'.format(run_id[:8])
+
+
+def get_job_name_prefix(job_name):
+    return '_'.join(job_name.split('_')[:2])
+
+
+def get_workflow_jobs(snapshot, prefix, statuses):
+    records = snapshot.get_records().values()
+    return [
+        v for v in records
+        if v.status in statuses and v.job_name is not None and v.job_name.startswith(prefix + '_')
+    ]
+
+
+def should_hold(job_name, max_pending, state_dir=None, snapshot_ttl=30):
+    """
+    submit held (bsub -H) if the workflow already has max_pending jobs
+    pending or held, the runner releases them as the queue drains
+    """
+    snapshot = JobSnapshot(state_dir=state_dir, ttl=snapshot_ttl)
+    queued = get_workflow_jobs(snapshot, get_job_name_prefix(job_name), QUEUED_STATUSES)
+    return len(queued) >= max_pending
+
+
+def get_held_jobs_dir(prefix, state_dir=None):
+    held_dir = os.path.join(get_state_dir(state_dir), 'held_jobs', prefix)
+    os.makedirs(held_dir, exist_ok=True)
+    return held_dir
+
+
+def record_held_job(job_name, job_id, cwd, state_dir=None):
+    """
+    remember the call dir of a held job, bjobs has no EXEC_CWD for a
+    job that was never dispatched
+    """
+    held_dir = get_held_jobs_dir(get_job_name_prefix(job_name), state_dir=state_dir)
+    atomic_write_json(os.path.join(held_dir, '{}.json'.format(job_id)), {'cwd': cwd})
+
+
+def _get_held_job_priority(held_dir, job_id, state_dir=None):
+    held_file = os.path.join(held_dir, '{}.json'.format(job_id))
+    if not os.path.exists(held_file):
+        return None
+
+    with open(held_file, 'rt') as reader:
+        cwd = json.load(reader)['cwd']
+
+    # only the runner releases jobs, keep sqlite off the submission path
+    from mondrian_runner.critical_path import get_call_priority
+
+    return get_call_priority(cwd, state_dir=state_dir)
+
+
+def get_release_order(held, held_dir, state_dir=None):
+    """
+    calls on the critical path first, by the priorities the runner wrote
+    for the workflow, then oldest first as upstream calls are submitted first
+    """
+    def release_order(record):
+        priority = _get_held_job_priority(held_dir, record.job_id, state_dir=state_dir)
+        # priorities start at 1, jobs without one go last
+        priority = 0 if priority is None else priority
+        return -priority, int(record.job_id.split('[')[0]), record.job_id
+
+    return sorted(held, key=release_order)
+
+
+def release_held_jobs(snapshot, prefix, max_pending, state_dir=None):
+    """
+    bresume held jobs of the workflow until max_pending jobs are pending
+    """
+    pending = get_workflow_jobs(snapshot, prefix, ['PEND'])
+    held = get_workflow_jobs(snapshot, prefix, ['PSUSP'])
+
+    num_release = min(max_pending - len(pending), len(held))
+    if num_release <= 0:
+        return []
+
+    held_dir = get_held_jobs_dir(prefix, state_dir=state_dir)
+    release = [v.job_id for v in get_release_order(held, held_dir, state_dir=state_dir)]
+    release = release[:num_release]
+
+    p = subprocess.Popen(['bresume'] + release, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    p.communicate()
+
+    for job_id in release:
+        held_file = os.path.join(held_dir, '{}.json'.format(job_id))
+        if os.path.exists(held_file):
+            os.remove(held_file)
+
+    logging.getLogger('mondrian_runner.hold_release').info(
+        'released {} held jobs'.format(len(release))
+    )
+
+    return release
+
+
+class HeldJobReleaser(threading.Thread):
+    """
+    background thread for the runner that releases held jobs of one workflow
+    """
+
+    def __init__(self, run_id, max_pending, interval=60, state_dir=None, snapshot_ttl=30):
+        super(HeldJobReleaser, self).__init__()
+        self.daemon = True
+
+        self.prefix = get_workflow_job_prefix(run_id)
+        self.max_pending = max_pending
+        self.interval = interval
+        self.state_dir = state_dir
+        self.snapshot = JobSnapshot(state_dir=state_dir, ttl=snapshot_ttl)
+
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                release_held_jobs(
+                    self.snapshot, self.prefix, self.max_pending, state_dir=self.state_dir
+                )
+            except Exception:
+                logging.getLogger('mondrian_runner.hold_release').exception(
+                    'failed to release held jobs'
+                )
+
+    def stop(self):
+        self._stop_event.set()
+        # the workflow is done, nothing of it is held anymore
+        shutil.rmtree(
+            os.path.join(get_state_dir(self.state_dir), 'held_jobs', self.prefix),
+            ignore_errors=True
+        )
@@ -0,0 +1,66 @@
+import json
+import os
+import time
+
+from mondrian_runner import utils
+from mondrian_runner.state import atomic_write_json
+from mondrian_runner.state import get_state_dir
+from mondrian_runner.state import locked
+
+
+class HostFailures(object):
+    """
+    failure score per execution host shared by all generate_bsub_command
+    calls, a json file under the state dir updated under an flock. scores
+    decay exponentially so hosts that were fixed drop out again.
+    """
+
+    def __init__(self, state_dir=None, half_life_hrs=24):
+        self.half_life = half_life_hrs * 3600
+
+        failures_dir = os.path.join(get_state_dir(state_dir), 'host_failures')
+        utils.makedirs(failures_dir)
+
+        self.scores_file = os.path.join(failures_dir, 'scores.json')
+        self.lock_file = os.path.join(failures_dir, 'scores.lock')
+
+    def _decayed(self, score, now):
+        return score['score'] * 0.5 ** ((now - score['updated']) / self.half_life)
+
+    def _load(self):
+        if not os.path.exists(self.scores_file):
+            return {}
+        try:
+            with open(self.scores_file, 'rt') as reader:
+                return json.load(reader)
+        except ValueError:
+            return {}
+
+    def record_failure(self, host, job_id):
+        """
+        count one failed attempt on host, each job id is only counted once
+        """
+        with locked(self.lock_file):
+            now = time.time()
+            scores = self._load()
+
+            score = scores.get(host, {'score': 0, 'updated': now, 'jobs': []})
+            if job_id in score['jobs']:
+                return
+
+            scores[host] = {
+                'score': self._decayed(score, now) + 1,
+                'updated': now,
+                'jobs': (score['jobs'] + [job_id])[-100:],
+            }
+
+            atomic_write_json(self.scores_file, scores)
+
+    def get_excluded_hosts(self, threshold):
+        now = time.time()
+        scores = self._load()
+        # rounded so n failures in quick succession reach a threshold of n
+        return sorted(
+            host for host, score in scores.items()
+            if round(self._decayed(score, now), 2) >= threshold
+        )
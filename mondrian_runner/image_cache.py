@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from mondrian_runner.state import atomic_write_json
+from mondrian_runner.state import locked
+
+
+class ImageCache(object):
+    """
+    node local copies of singularity images, stored by content hash so
+    the same image under different paths is copied once. the hash of an
+    image path is remembered per size and mtime, so the shared image is only
+    read when it is new or has changed. copies are written to a tmp file
+    without holding the lock, then renamed into place under an flock shared
+    by all jobs on the host, and the least recently used images are evicted
+    once the cache exceeds max_gb.
+    """
+
+    def __init__(self, cache_dir, max_gb=50):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_gb * 1024 ** 3
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        self.lock_file = os.path.join(cache_dir, 'cache.lock')
+
+    def _load_index(self):
+        if not os.path.exists(self.index_file):
+            return {}
+        try:
+            with open(self.index_file, 'rt') as reader:
+                return json.load(reader)
+        except ValueError:
+            return {}
+
+    def _copy_and_hash(self, image):
+        """
+        copy the image to a tmp file in the cache while hashing it, one read
+        of the shared copy. returns the tmp file and the content hash
+        """
+        sha = hashlib.sha256()
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with open(image, 'rb') as reader, os.fdopen(fd, 'wb') as writer:
+                for chunk in iter(lambda: reader.read(16 * 1024 * 1024), b''):
+                    sha.update(chunk)
+                    writer.write(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+        return tmp_path, sha.hexdigest()
+
+    def _evict(self, keep):
+        images = [
+            os.path.join(self.cache_dir, v) for v in os.listdir(self.cache_dir) if v.endswith('.sif')
+        ]
+        images = sorted(images, key=lambda v: os.stat(v).st_atime)
+
+        total = sum(os.path.getsize(v) for v in images)
+        for image in images:
+            if total <= self.max_bytes:
+                break
+            if image == keep:
+                continue
+            total -= os.path.getsize(image)
+            # running jobs keep their open copy, the data goes once they exit
+            os.remove(image)
+
+    def get(self, image):
+        """
+        path of the node local copy of image, copied to the cache if needed
+        """
+        stat = os.stat(image)
+        key = '{}:{}:{}'.format(os.path.abspath(image), stat.st_size, stat.st_mtime)
+
+        with locked(self.lock_file):
+            cached = self._load_index().get(key)
+            if cached is not None and os.path.exists(cached):
+                # lru order is by access time, set it explicitly for noatime mounts
+                os.utime(cached)
+                return cached
+
+        # copy without the lock so jobs whose image is cached do not wait
+        # behind it, jobs that miss at the same time each make a copy
+        tmp_path, digest = self._copy_and_hash(image)
+
+        with locked(self.lock_file):
+            cached = os.path.join(self.cache_dir, '{}.sif'.format(digest))
+            if os.path.exists(cached):
+                os.remove(tmp_path)
+            else:
+                os.rename(tmp_path, cached)
+
+            index = self._load_index()
+            index[key] = cached
+            self._evict(cached)
+            index = {k: v for k, v in index.items() if os.path.exists(v)}
+            atomic_write_json(self.index_file, index)
+
+            os.utime(cached)
+
+        return cached
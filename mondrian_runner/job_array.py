@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from mondrian_runner import utils
+from mondrian_runner.hold_release import get_job_name_prefix
+from mondrian_runner.job_groups import get_workflow_root
+from mondrian_runner.state import atomic_write_json
+from mondrian_runner.state import get_state_dir
+from mondrian_runner.state import locked
+from mondrian_runner.submit_limiter import run_bsub
+
+
+def get_batch_dir(resource_args, job_name_prefix, state_dir=None):
+    """
+    spool dir shared by all submissions of one workflow with the same lsf resource request
+    """
+    key = hashlib.sha1(json.dumps([job_name_prefix] + resource_args).encode()).hexdigest()
+    batch_dir = os.path.join(get_state_dir(state_dir), 'job_arrays', key)
+
+    utils.makedirs(os.path.join(batch_dir, 'spool'))
+    utils.makedirs(os.path.join(batch_dir, 'results'))
+
+    return batch_dir
+
+
+def _write_result(batch_dir, request_id, result):
+    result_file = os.path.join(batch_dir, 'results', request_id)
+    with open(result_file + '.tmp', 'wt') as writer:
+        writer.write(result)
+    os.rename(result_file + '.tmp', result_file)
+
+
+def _claim_requests(batch_dir, max_size):
+    spool_dir = os.path.join(batch_dir, 'spool')
+
+    requests = []
+    for filename in sorted(os.listdir(spool_dir)):
+        if not filename.endswith('.json'):
+            continue
+        # the rest go into the next array
+        if len(requests) == max_size:
+            break
+        filepath = os.path.join(spool_dir, filename)
+        with open(filepath, 'rt') as reader:
+            requests.append((filename[:-len('.json')], json.load(reader)))
+        os.remove(filepath)
+
+    return requests
+
+
+def submit_job_array(resource_args, elements, limiter=None, submit_retries=3):
+    """
+    submit elements as one lsf job array. the array dir with the manifest and
+    one link per index to the element's cwd lives in the workflow's execution
+    root, so it is on the same shared filesystem as the jobs and is not mixed
+    into any one call's outputs. lsf substitutes %I in -cwd, so bjobs
+    EXEC_CWD reports <array dir>/<index>, the link and not the call dir
+    itself. reading and writing under it works because it follows the link.
+    """
+    root = get_workflow_root(elements[0]['cwd'])
+    if root is None:
+        root = os.path.join(elements[0]['cwd'], 'execution')
+    array_dir = os.path.join(root, 'job_array.{}'.format(uuid.uuid4().hex))
+    utils.makedirs(array_dir)
+
+    for index, element in enumerate(elements, start=1):
+        os.symlink(element['cwd'], os.path.join(array_dir, str(index)))
+
+    manifest = os.path.join(array_dir, 'manifest.json')
+    atomic_write_json(manifest, {'elements': elements})
+
+    # named like the workflow's own jobs so --max_pending counts and releases the elements
+    job_name = '{}_array[1-{}]'.format(get_job_name_prefix(elements[0]['job_name']), len(elements))
+    cmd = ['bsub'] + resource_args + [
+        '-J', job_name,
+        '-cwd', os.path.join(array_dir, '%I'),
+        '-o', os.path.join(array_dir, 'lsf.%I.out'),
+        '-e', os.path.join(array_dir, 'lsf.%I.err'),
+        '--wrap', utils.get_runner_executable(), 'run_array_element', '--manifest', manifest
+    ]
+
+    stdout = run_bsub(cmd, job_name, limiter=limiter, retries=submit_retries)
+    job_id = stdout.split('<')[1].split('>')[0]
+
+    return ['{}[{}]'.format(job_id, index) for index in range(1, len(elements) + 1)]
+
+
+def _submit_spooled(batch_dir, resource_args, max_size, limiter=None, submit_retries=3):
+    requests = _claim_requests(batch_dir, max_size)
+    if not requests:
+        return
+
+    try:
+        job_ids = submit_job_array(
+            resource_args, [v[1] for v in requests],
+            limiter=limiter, submit_retries=submit_retries
+        )
+    except Exception as e:
+        # fail the waiting processes now instead of at their timeout
+        for request_id, _ in requests:
+            _write_result(batch_dir, request_id, 'ERROR {}'.format(e))
+        raise
+
+    for (request_id, _), job_id in zip(requests, job_ids):
+        _write_result(batch_dir, request_id, job_id)
+
+
+def submit_batched(
+        resource_args, element, window=5, state_dir=None, timeout=600, max_size=1000,
+        limiter=None, submit_retries=3
+):
+    """
+    queue one job for submission as part of a job array. the first process to
+    take the batch lock waits for window seconds, then submits everything that
+    was spooled by the same workflow with the same resource request in one
+    bsub call and hands each process its array element id. max_size should
+    not exceed the cluster's MAX_JOB_ARRAY_SIZE (1000 by default).
+    """
+    batch_dir = get_batch_dir(
+        resource_args, get_job_name_prefix(element['job_name']), state_dir=state_dir
+    )
+
+    request_id = '{:.6f}.{}'.format(time.time(), uuid.uuid4().hex)
+    result_file = os.path.join(batch_dir, 'results', request_id)
+    atomic_write_json(os.path.join(batch_dir, 'spool', request_id + '.json'), element)
+
+    start = time.time()
+    while time.time() - start < timeout:
+        if os.path.exists(result_file):
+            with open(result_file, 'rt') as reader:
+                job_id = reader.read().strip()
+            os.remove(result_file)
+            if job_id.startswith('ERROR'):
+                raise Exception('job array submission failed: {}'.format(job_id))
+            return job_id
+
+        with locked(os.path.join(batch_dir, 'lock'), blocking=False) as acquired:
+            if not acquired:
+                # another process is collecting the batch
+                time.sleep(0.5)
+                continue
+
+            if not os.path.exists(result_file):
+                time.sleep(window)
+                _submit_spooled(
+                    batch_dir, resource_args, max_size,
+                    limiter=limiter, submit_retries=submit_retries
+                )
+
+    raise Exception('timed out waiting for job array submission of {}'.format(element['cwd']))
+
+
+def run_array_element(manifest):
+    """
+    runs on the compute node, executes the container command for this array index
+    """
+    index = int(os.environ['LSB_JOBINDEX'])
+
+    with open(manifest, 'rt') as reader:
+        element = json.load(reader)['elements'][index - 1]
+
+    os.chdir(element['cwd'])
+
+    with open(element['out'], 'at') as out, open(element['err'], 'at') as err:
+        returncode = subprocess.call(element['cmd'], stdout=out, stderr=err)
+
+    sys.exit(returncode)
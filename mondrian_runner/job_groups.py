@@ -0,0 +1,51 @@
+import re
+import subprocess
+
+UUID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def get_workflow_id(cwd):
+    """
+    id of the top level workflow from a cromwell call dir such as
+    cromwell-executions/<workflow>/<run_id>/call-<task>/<subworkflow>/<sub_run_id>/...
+    """
+    for part in cwd.split('/'):
+        if UUID_RE.match(part):
+            return part
+    return None
+
+
+def get_workflow_root(cwd):
+    """
+    execution root of the top level workflow, cromwell-executions/<workflow>/<run_id>,
+    for a cromwell call dir
+    """
+    parts = cwd.split('/')
+    for idx, part in enumerate(parts):
+        if UUID_RE.match(part):
+            return '/'.join(parts[:idx + 1])
+    return None
+
+
+def get_job_group(job_group_root, run_id):
+    return '{}/{}'.format(job_group_root.rstrip('/'), run_id)
+
+
+def create_job_group(job_group, limit=None):
+    """
+    create the lsf job group for a workflow with a limit on running jobs,
+    updates the limit if the group exists from an earlier attempt
+    """
+    cmd = ['bgadd']
+    if limit is not None:
+        cmd += ['-L', str(limit)]
+    cmd.append(job_group)
+
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    cmdout, cmderr = p.communicate()
+
+    if p.returncode and b'already exists' in cmdout + cmderr:
+        if limit is not None:
+            subprocess.check_output(['bgmod', '-L', str(limit), job_group])
+    elif p.returncode:
+        raise Exception('bgadd failed. stderr:{}, stdout:{}'.format(cmderr, cmdout))
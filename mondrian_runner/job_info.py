@@ -0,0 +1,49 @@
+import json
+import os
+
+from mondrian_runner.state import atomic_write_json
+
+
+def walltime_to_minutes(walltime):
+    hours, mins = walltime.split(':')
+    return int(hours) * 60 + int(mins)
+
+
+def minutes_to_walltime(minutes):
+    return '{}:{:02d}'.format(minutes // 60, minutes % 60)
+
+
+def cache_job_information(job_id, walltime, memory_gb, attempt_number, cwd, queue=None):
+    cache_file = os.path.join(cwd, 'execution', 'job_information.json')
+    if os.path.exists(cache_file):
+        print('Cannot cache, file exists:{}'.format(cache_file))
+
+    job_info = {'job_id': job_id, 'walltime': walltime, 'memory_gb': memory_gb,
+                'attempt': attempt_number}
+    if queue is not None:
+        job_info['queue'] = queue
+
+    atomic_write_json(cache_file, job_info)
+
+
+def update_job_information(cwd, data):
+    """
+    add fields to an existing job_information.json
+    """
+    cache_file = os.path.join(cwd, 'execution', 'job_information.json')
+    if not os.path.exists(cache_file):
+        return
+
+    with open(cache_file, 'rt') as reader:
+        job_info = json.load(reader)
+
+    job_info.update(data)
+
+    atomic_write_json(cache_file, job_info)
+
+
+def retrieve_job_information(cwd):
+    cache_file = os.path.join(cwd, 'execution', 'job_information.json')
+    with open(cache_file, 'rt') as reader:
+        data = json.load(reader)
+    return data
@@ -0,0 +1,96 @@
+import json
+import os
+
+from mondrian_runner.state import atomic_write_json
+from mondrian_runner.state import get_state_dir
+
+
+class JobSamples(object):
+    """
+    ring buffer of usage samples for one job, one json file per job
+    under the state dir. each check_alive call appends at most one sample
+    per bjobs snapshot. the file also keeps the sample after which the job
+    stopped making cpu progress, so idle time is not limited by the
+    size of the buffer.
+    """
+
+    def __init__(self, job_id, state_dir=None, max_samples=10, min_cpu_fraction=0.01):
+        samples_dir = os.path.join(get_state_dir(state_dir), 'job_samples')
+        os.makedirs(samples_dir, exist_ok=True)
+
+        self.samples_file = os.path.join(samples_dir, '{}.json'.format(job_id))
+        self.max_samples = max_samples
+        self.min_cpu_fraction = min_cpu_fraction
+
+        self.samples = []
+        self.idle_since = None
+
+    def load(self):
+        if not os.path.exists(self.samples_file):
+            return self.samples
+
+        try:
+            with open(self.samples_file, 'rt') as reader:
+                data = json.load(reader)
+        except ValueError:
+            return self.samples
+
+        self.samples = data['samples']
+        self.idle_since = data['idle_since']
+
+        return self.samples
+
+    def _is_idle(self, prev_sample, sample):
+        if None in (prev_sample['cpu_used'], sample['cpu_used'],
+                    prev_sample['run_time'], sample['run_time']):
+            return False
+
+        run_time = sample['run_time'] - prev_sample['run_time']
+        if run_time <= 0:
+            return False
+
+        cpu_used = sample['cpu_used'] - prev_sample['cpu_used']
+        return cpu_used / run_time < self.min_cpu_fraction
+
+    def append(self, record):
+        samples = self.load()
+
+        # checks that land within the same snapshot see the same numbers
+        if samples and samples[-1]['time'] >= record.timestamp:
+            return samples
+
+        sample = {
+            'time': record.timestamp,
+            'max_mem': record.max_mem,
+            'mem': record.mem,
+            'cpu_used': record.cpu_used,
+            'run_time': record.run_time,
+        }
+
+        if samples and self._is_idle(samples[-1], sample):
+            if self.idle_since is None:
+                self.idle_since = samples[-1]
+        else:
+            self.idle_since = None
+
+        samples.append(sample)
+        self.samples = samples[-self.max_samples:]
+
+        atomic_write_json(
+            self.samples_file, {'samples': self.samples, 'idle_since': self.idle_since}
+        )
+
+        return self.samples
+
+    def idle_run_time(self):
+        """
+        run time in seconds since the job last made cpu progress
+        """
+        if self.idle_since is None or not self.samples:
+            return 0
+
+        return self.samples[-1]['run_time'] - self.idle_since['run_time']
+
+    def remove(self):
+        if os.path.exists(self.samples_file):
+            os.remove(self.samples_file)
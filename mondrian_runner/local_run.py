@@ -2,7 +2,6 @@ import os
 import shutil
 
 import mondrian_runner.utils as utils
-import pkg_resources
 
 
 def pull_cromwell_jar(download_dir):
@@ -36,7 +35,8 @@ def submit_pipeline(
 
 
 def generate_run_config(output_dir):
-    reference_config = pkg_resources.resource_filename('mondrian_runner', 'data/run.config')
+    # plain path lookup, importing pkg_resources costs more than the rest of the cli
+    reference_config = os.path.join(os.path.dirname(__file__), 'data', 'run.config')
 
     shutil.copyfile(reference_config, os.path.join(output_dir, 'run.config'))
 
@@ -0,0 +1,175 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class Inotify(object):
+    """
+    minimal ctypes binding for inotify, watches one directory and reports
+    events for one file name in it. raises OSError where inotify is missing
+    """
+
+    def __init__(self, directory, filename):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, 'libc not found')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify not available')
+
+        self.filename = filename.encode()
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        wd = libc.inotify_add_watch(self.fd, directory.encode(), WATCH_MASK)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            names.append(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+        return names
+
+    def wait(self, timeout):
+        """
+        block until the file changes or timeout seconds pass, events for
+        other files in the directory (other workflows' logs) are skipped
+        """
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if readable and self.filename in self._read_events():
+                return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LogFollower(object):
+    """
+    follows a log file from its current end, reopening it when it is rotated
+    or recreated. polls with an interval that doubles while the file is idle
+    and resets when it grows, and where inotify is available also wakes up
+    as soon as the file changes
+    """
+
+    def __init__(self, log_file, min_poll_interval=0.5, max_poll_interval=10, inotify=True):
+        self.log_file = log_file
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.poll_interval = min_poll_interval
+
+        self.reader = None
+        self.inode = None
+        self.partial = b''
+        if os.path.exists(log_file):
+            self._open()
+            self.reader.seek(0, os.SEEK_END)
+
+        self.inotify = None
+        if inotify:
+            try:
+                self.inotify = Inotify(
+                    os.path.dirname(os.path.abspath(log_file)), os.path.basename(log_file)
+                )
+            except OSError:
+                pass
+
+    def _open(self):
+        self.reader = open(self.log_file, 'rb')
+        self.inode = os.fstat(self.reader.fileno()).st_ino
+
+    def exists(self):
+        return os.path.exists(self.log_file)
+
+    def read_lines(self):
+        """
+        complete lines written since the last call, a line still being
+        written is returned once it ends
+        """
+        data = b''
+        if self.reader is not None:
+            data = self.reader.read()
+
+        try:
+            stat = os.stat(self.log_file)
+        except FileNotFoundError:
+            stat = None
+
+        rotated = stat is not None and stat.st_ino != self.inode
+        truncated = stat is not None and self.reader is not None and stat.st_size < self.reader.tell()
+        if rotated or truncated:
+            if self.reader is not None:
+                self.reader.close()
+            self._open()
+            data += self.reader.read()
+
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+
+        if data:
+            self.poll_interval = self.min_poll_interval
+
+        return [v.decode(errors='replace') for v in lines]
+
+    def backoff(self):
+        """
+        seconds until the next poll, doubles while the file is idle
+        """
+        interval = self.poll_interval
+        self.poll_interval = min(self.poll_interval * 2, self.max_poll_interval)
+        return interval
+
+    def wait(self, timeout):
+        """
+        block until the log may have changed, at most timeout seconds
+        """
+        timeout = min(timeout, self.backoff())
+
+        # inotify only sees writes made on this host, the log dir is usually on a
+        # network filesystem written by a cromwell server elsewhere. wait at most
+        # the poll interval so the caller re-reads the file
+        if self.inotify is not None:
+            self.inotify.wait(timeout)
+            return
+
+        time.sleep(timeout)
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+        if self.inotify is not None:
+            self.inotify.close()
@@ -0,0 +1,334 @@
+import getpass
+import json
+import os
+import re
+import subprocess
+import time
+
+from mondrian_runner.state import atomic_write_json
+from mondrian_runner.state import get_state_dir
+from mondrian_runner.state import locked
+
+BJOBS_FIELDS = (
+    'JOBID JOBINDEX STAT:6 MEM:15 MAX_MEM:15 MEMLIMIT:15 SLOTS:10 CPU_USED:20 '
+    'RUN_TIME:20 RUNTIMELIMIT:30 JOB_NAME:256 EXEC_CWD:1024 EXEC_HOST:256 EXIT_REASON:50'
+)
+
+MEM_UNITS_GB = {'K': 1.0 / 1024 ** 2, 'M': 1.0 / 1024, 'G': 1.0, 'T': 1024.0}
+
+
+def parse_mem_gb(value):
+    """
+    convert bjobs memory strings such as '1.5 Gbytes' or '4 G' to GB
+    :param value: memory string from bjobs
+    :type value: str
+    """
+    if value is None or value.strip() == '':
+        return None
+
+    size, unit = value.split()
+    return float(size) * MEM_UNITS_GB[unit[0].upper()]
+
+
+def parse_seconds(value):
+    """
+    convert bjobs time strings such as '12.5 second(s)' or '01:02:03.50' to seconds
+    :param value: time string from bjobs
+    :type value: str
+    """
+    if value is None or value.strip() == '':
+        return None
+
+    value = value.split()[0]
+
+    seconds = 0.0
+    for part in value.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_run_limit(value):
+    """
+    convert bjobs RUNTIMELIMIT such as '240.0/hostA' (minutes, normalized to
+    the host) to seconds
+    :param value: run limit string from bjobs
+    :type value: str
+    """
+    if value is None or value.strip() in ('', '-'):
+        return None
+
+    return float(value.split('/')[0]) * 60
+
+
+def parse_exec_hosts(value):
+    """
+    host names from bjobs EXEC_HOST such as '4*hostA:2*hostB'
+    :param value: exec host string from bjobs
+    :type value: str
+    """
+    if value is None or value.strip() in ('', '-'):
+        return []
+
+    return [v.split('*')[-1] for v in value.split(':')]
+
+
+class JobRecord(object):
+    """
+    parsed bjobs record with all fields check_alive needs for a job
+    """
+
+    def __init__(self, record, timestamp=None):
+        # time the record was queried from lsf
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.job_id = get_record_job_id(record) if 'JOBID' in record else None
+        self.job_name = record.get('JOB_NAME') or None
+        self.status = record['STAT']
+        self.max_mem = parse_mem_gb(record.get('MAX_MEM'))
+        # current memory, max_mem is the peak so far and never drops
+        self.mem = parse_mem_gb(record.get('MEM'))
+        self.mem_limit = parse_mem_gb(record.get('MEMLIMIT'))
+        self.slots = int(record['SLOTS']) if record.get('SLOTS') else None
+        self.cpu_used = parse_seconds(record.get('CPU_USED'))
+        self.run_time = parse_seconds(record.get('RUN_TIME'))
+        self.run_limit = parse_run_limit(record.get('RUNTIMELIMIT'))
+        self.exec_cwd = record.get('EXEC_CWD') or None
+        self.exec_hosts = parse_exec_hosts(record.get('EXEC_HOST'))
+        self.exit_reason = record.get('EXIT_REASON') or None
+
+    @property
+    def requested_mem(self):
+        # MEMLIMIT is reported per slot
+        if self.mem_limit is None or self.slots is None:
+            return None
+        return self.mem_limit * self.slots
+
+
+class JobNotFoundError(Exception):
+    pass
+
+
+def get_record_job_id(record):
+    """
+    job id as used on the command line, jobid[index] for job array elements
+    """
+    if record.get('JOBINDEX') not in (None, '', '0'):
+        return '{}[{}]'.format(record['JOBID'], record['JOBINDEX'])
+    return record['JOBID']
+
+
+def _parse_bjobs_json(stdout):
+    try:
+        return json.loads(stdout)
+    except ValueError:
+        # bjobs prints a plain text message when there are no jobs to report
+        return {'JOBS': 0, 'RECORDS': []}
+
+
+def query_job(job_id, fields=BJOBS_FIELDS):
+    cmd = ['bjobs', '-o', fields, '-json', job_id]
+    stdout = subprocess.check_output(cmd).decode()
+    stdout = json.loads(stdout)
+
+    assert stdout['JOBS'] == 1
+    record = stdout['RECORDS'][0]
+
+    if 'ERROR' in record:
+        raise JobNotFoundError('bjobs failed for job {}: {}'.format(job_id, record['ERROR']))
+
+    return record
+
+
+def query_jobs(job_ids, fields=BJOBS_FIELDS, chunk_size=500):
+    """
+    bulk query for a list of job ids, jobs lsf no longer knows about are left out
+    """
+    records = {}
+    for i in range(0, len(job_ids), chunk_size):
+        cmd = ['bjobs', '-o', fields, '-json'] + job_ids[i:i + chunk_size]
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        cmdout, cmderr = p.communicate()
+
+        for record in _parse_bjobs_json(cmdout.decode())['RECORDS']:
+            if 'ERROR' in record:
+                continue
+            records[get_record_job_id(record)] = record
+
+    return records
+
+
+def _parse_history_section(section):
+    reason = re.search(r'(TERM_[A-Z_]+)', section)
+    if reason is not None:
+        reason = reason.group(1)
+    elif re.search(r'Exited with exit code|Done successfully|Completed <(done|exit)>', section):
+        # bacct only reports 'Completed <done>.' for jobs that finished normally
+        reason = ''
+
+    max_mem = re.search(r'MAX MEM: ([\d.]+ \w+);', section)
+    if max_mem is not None:
+        max_mem = parse_mem_gb(max_mem.group(1))
+
+    # bhist -l time summary table
+    run_time = re.search(r'PEND +PSUSP +RUN .*\n +(\d+) +(\d+) +(\d+)', section)
+    if run_time is not None:
+        run_time = float(run_time.group(3))
+    else:
+        # bacct -l stats table
+        run_time = re.search(r'CPU_T +WAIT +TURNAROUND .*\n +[\d.]+ +(\d+) +(\d+)', section)
+        if run_time is not None:
+            run_time = float(run_time.group(2)) - float(run_time.group(1))
+
+    # bhist: 'Dispatched 1 Task(s) on Host(s) <hostA>', bacct: 'Dispatched to <hostA>'
+    exec_host = re.search(
+        r'Dispatched (?:to|\d+ Task\(s\) on Host\(s\)) <(?:\d+\*)?([^>]+)>', section
+    )
+    if exec_host is not None:
+        exec_host = exec_host.group(1)
+
+    return {
+        'exit_reason': reason, 'max_mem': max_mem, 'run_time': run_time, 'exec_host': exec_host
+    }
+
+
+def _parse_history(stdout):
+    # long lines are wrapped onto lines indented by 21 spaces
+    stdout = re.sub(r'\n {21}', '', stdout)
+
+    history = {}
+    for section in re.split(r'\n-{10,}\n', stdout):
+        job_id = re.search(r'Job <(\d+(?:\[\d+\])?)>', section)
+        if job_id is None:
+            continue
+        history[job_id.group(1)] = _parse_history_section(section)
+
+    return history
+
+
+def query_job_history(job_ids, chunk_size=500):
+    """
+    exit reason, peak memory, run time and first execution host for finished jobs that bjobs no
+    longer reports, from bhist and for anything bhist misses from bacct
+    """
+    history = {}
+    for cmd_name in ['bhist', 'bacct']:
+        missing = [v for v in job_ids if v not in history]
+        for i in range(0, len(missing), chunk_size):
+            cmd = [cmd_name, '-l'] + missing[i:i + chunk_size]
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            cmdout, cmderr = p.communicate()
+
+            for job_id, data in _parse_history(cmdout.decode()).items():
+                if data['exit_reason'] is not None:
+                    history[job_id] = data
+
+    return history
+
+
+def query_all_jobs(fields=BJOBS_FIELDS, job_group=None):
+    """
+    all jobs of the current user, or of all users in job_group
+    """
+    if job_group is not None:
+        cmd = ['bjobs', '-a', '-json', '-u', 'all', '-g', job_group, '-o', fields]
+    else:
+        cmd = ['bjobs', '-a', '-json', '-u', getpass.getuser(), '-o', fields]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    cmdout, cmderr = p.communicate()
+
+    stdout = _parse_bjobs_json(cmdout.decode())
+
+    records = {}
+    for record in stdout['RECORDS']:
+        if 'ERROR' in record:
+            continue
+        records[get_record_job_id(record)] = record
+
+    return records
+
+
+class JobSnapshot(object):
+    """
+    bulk bjobs query for all jobs of the current user, or of one job group,
+    shared between check_alive processes through a json file under the state dir.
+    the file is refreshed by at most one process per ttl interval.
+    """
+
+    def __init__(self, state_dir=None, ttl=30, job_group=None):
+        self.ttl = ttl
+        self.job_group = job_group
+        self.cache_file = None
+        if ttl > 0:
+            state_dir = get_state_dir(state_dir)
+            snapshot_name = 'bjobs_snapshot'
+            if job_group is not None:
+                snapshot_name += '.' + job_group.strip('/').replace('/', '.')
+            self.cache_file = os.path.join(state_dir, snapshot_name + '.json')
+        self._records = None
+        self._timestamp = None
+        self._loaded_at = None
+
+    def _read_cache(self):
+        if not os.path.exists(self.cache_file):
+            return None
+
+        try:
+            with open(self.cache_file, 'rt') as reader:
+                data = json.load(reader)
+        except ValueError:
+            return None
+
+        if time.time() - data['timestamp'] > self.ttl:
+            return None
+
+        return data
+
+    def _load(self):
+        data = self._read_cache()
+        if data is not None:
+            return data
+
+        with locked(self.cache_file + '.lock'):
+            # another process may have refreshed while we waited on the lock
+            data = self._read_cache()
+            if data is None:
+                data = {
+                    'timestamp': time.time(),
+                    'records': query_all_jobs(job_group=self.job_group)
+                }
+                atomic_write_json(self.cache_file, data)
+
+        return data
+
+    def _refresh(self):
+        # long lived processes such as the check_alive server
+        # reload the snapshot once it expires
+        if self._records is None or time.time() - self._loaded_at > self.ttl:
+            data = self._load()
+            self._records = data['records']
+            self._timestamp = data['timestamp']
+            self._loaded_at = time.time()
+
+    def get_records(self):
+        """
+        all jobs of the current user by job id
+        """
+        if self.cache_file is None:
+            timestamp = time.time()
+            records = query_all_jobs(job_group=self.job_group)
+            return {k: JobRecord(v, timestamp=timestamp) for k, v in records.items()}
+
+        self._refresh()
+
+        return {k: JobRecord(v, timestamp=self._timestamp) for k, v in self._records.items()}
+
+    def get_record(self, job_id):
+        if self.cache_file is None:
+            return JobRecord(query_job(job_id))
+
+        self._refresh()
+
+        if job_id in self._records:
+            return JobRecord(self._records[job_id], timestamp=self._timestamp)
+
+        # submitted after the snapshot was taken
+        return JobRecord(query_job(job_id))
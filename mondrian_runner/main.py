@@ -1,43 +1,137 @@
-from mondrian_runner import utils
-from mondrian_runner.abort import abort
-from mondrian_runner.check_alive import check_alive
 from mondrian_runner.cli import parse_args
-from mondrian_runner.generate_bsub_command import generate_bsub_command
-from mondrian_runner.run import runner
-from mondrian_runner.local_run import local_runner
 
 
 def main():
+    # subcommand modules are imported in their branch so the hot
+    # check_alive and generate_bsub_command paths skip the rest
     args = parse_args()
 
     if args['which'] == 'check_alive':
-        check_alive(
-            args['job_id'], kill_hung_jobs=args['kill_hung_jobs']
+        from mondrian_runner.check_alive_client import forward_check_alive
+
+        forwarded = args['socket'] is not None and forward_check_alive(
+            args['socket'], args['job_id'], kill_hung_jobs=args['kill_hung_jobs'],
+            kill_stalled_jobs=args['kill_stalled_jobs'], job_group=args['job_group']
+        )
+        # no server running, check in process
+        if not forwarded:
+            from mondrian_runner.check_alive import check_alive
+
+            check_alive(
+                args['job_id'], kill_hung_jobs=args['kill_hung_jobs'],
+                state_dir=args['state_dir'], snapshot_ttl=args['snapshot_ttl'],
+                hung_job_samples=args['hung_job_samples'],
+                kill_stalled_jobs=args['kill_stalled_jobs'],
+                stall_window_mins=args['stall_window_mins'],
+                job_group=args['job_group'],
+                extend_walltime_hrs=args['extend_walltime_hrs'],
+                walltime_margin_mins=args['walltime_margin_mins']
+            )
+    elif args['which'] == 'check_alive_server':
+        from mondrian_runner import utils
+        from mondrian_runner.check_alive_server import check_alive_server
+
+        utils.init_console_logger(args['log_level'])
+        check_alive_server(
+            socket_path=args['socket'], state_dir=args['state_dir'],
+            snapshot_ttl=args['snapshot_ttl'], hung_job_samples=args['hung_job_samples'],
+            stall_window_mins=args['stall_window_mins'], usage_db=args['usage_db'],
+            extend_walltime_hrs=args['extend_walltime_hrs'],
+            walltime_margin_mins=args['walltime_margin_mins']
         )
     elif args['which'] == 'generate_bsub_command':
+        from mondrian_runner.generate_bsub_command import generate_bsub_command
+
         generate_bsub_command(
             args["cwd"], args["multiplier"], args["walltime"], args["memory_gb"],
             args["cpu"], args["job_name"], args["out"], args["err"], args["docker_cwd"],
             args["singularity_img"], args["job_shell"], args["docker_script"],
-            max_mem=args['max_mem'], bind_mounts=args['bind_mounts'],
-            lsf_extra_args=args['lsf_extra_args']
+            max_mem=args['max_mem'], max_walltime_hrs=args['max_walltime_hrs'],
+            bind_mounts=args['bind_mounts'], lsf_extra_args=args['lsf_extra_args'],
+            headroom=args['headroom'], usage_db=args['usage_db'],
+            right_size=args['right_size'],
+            array_batch_window=args['array_batch_window'], state_dir=args['state_dir'],
+            submit_rate=args['submit_rate'], submit_burst=args['submit_burst'],
+            submit_retries=args['submit_retries'], max_pending=args['max_pending'],
+            job_group_root=args['job_group_root'],
+            host_failure_threshold=args['host_failure_threshold'],
+            host_failure_half_life_hrs=args['host_failure_half_life_hrs'],
+            queue_tiers=args['queue_tiers'],
+            critical_path_priority=args['critical_path_priority'],
+            scratch=args['scratch'], scratch_gb=args['scratch_gb'],
+            image_cache_dir=args['image_cache_dir'], image_cache_gb=args['image_cache_gb']
         )
+    elif args['which'] == 'run_task':
+        from mondrian_runner.task_wrapper import run_task
+
+        run_task(args['task'])
+    elif args['which'] == 'run_array_element':
+        from mondrian_runner.job_array import run_array_element
+
+        run_array_element(args['manifest'])
     elif args["which"] == "run":
+        from mondrian_runner import utils
+        from mondrian_runner.run import runner
+
         utils.init_console_logger(args['log_level'])
         runner(
             args['server_url'], args['wdl_file'], args['input_json'],
             args['options_json'], args['cache_dir'], args['mondrian_dir'],
             imports=args['imports'],
             delete_intermediates=args['delete_intermediates'],
-            try_reattach=args['try_reattach']
+            try_reattach=args['try_reattach'],
+            usage_db=args['usage_db'],
+            max_pending=args['max_pending'],
+            job_group_root=args['job_group_root'],
+            job_group_limit=args['job_group_limit'],
+            critical_path_priority=args['critical_path_priority'],
+            state_dir=args['state_dir']
+        )
+    elif args["which"] == "run_batch":
+        from mondrian_runner import utils
+        from mondrian_runner.run_batch import run_batch
+
+        utils.init_console_logger(args['log_level'])
+        run_batch(
+            args['server_url'], args['wdl_file'], args['manifest'], args['mondrian_dir'],
+            imports=args['imports'], max_in_flight=args['max_in_flight'],
+            delete_intermediates=args['delete_intermediates'],
+            try_reattach=args['try_reattach'], poll_interval=args['poll_interval'],
+            max_poll_interval=args['max_poll_interval'], max_pending=args['max_pending'],
+            state_dir=args['state_dir'], summary=args['summary']
         )
     elif args["which"] == "local_run":
+        from mondrian_runner.local_run import local_runner
+
         local_runner(
             args['wdl_file'], args['input_json'],
             args['options_json'], args['cache_dir'], imports=args['imports'],
             cromwell_jar=args['cromwell_jar']
         )
     elif args["which"] == "abort":
+        from mondrian_runner.abort import abort
+
         abort(args['server_url'], args['cache_dir'], args['run_id'])
+    elif args["which"] == "monitor":
+        import os
+
+        from mondrian_runner import utils
+        from mondrian_runner.workflow_monitor import monitor_workflows
+
+        utils.init_console_logger(args['log_level'])
+
+        run_ids = args['run_ids'] + [
+            utils.get_latest_id_from_cache_dir(v) for v in args['cache_dirs']
+        ]
+        workflow_log_dir = None
+        if args['mondrian_dir'] is not None:
+            workflow_log_dir = os.path.join(args['mondrian_dir'], 'cromwell-workflow-logs')
+
+        statuses = monitor_workflows(
+            args['server_url'], run_ids, workflow_log_dir=workflow_log_dir,
+            poll_interval=args['poll_interval'], max_poll_interval=args['max_poll_interval']
+        )
+        for run_id in run_ids:
+            print('{}\t{}'.format(run_id, statuses[run_id]))
     else:
         raise Exception('unknown parser option: {} '.format(args['which']))
@@ -0,0 +1,61 @@
+import re
+import time
+
+# per workflow log lines that mean the workflow reached a final state, e.g.
+# 'WorkflowExecutionActor-<id> [UUID(<id8>)]: Workflow <name> complete. Final Outputs:'
+# 'WorkflowActor-<id> [UUID(<id8>)]: transitioning from <state> to WorkflowFailedState'
+TERMINAL_MARKER_RE = re.compile(
+    r'Workflow \S+ complete\. Final Outputs'
+    r'|\bWorkflowActor-\S+ .*\btransitioning from \w+ to Workflow(Succeeded|Failed|Aborted)State'
+)
+
+
+def is_terminal_marker(line):
+    return TERMINAL_MARKER_RE.search(line) is not None
+
+
+class PollScheduler(object):
+    """
+    when to check the status of a workflow next. the interval doubles up to
+    max_interval while the status stays the same, drops back to min_interval
+    when the status changes or the workflow log shows activity, and a
+    terminal marker in the log makes the next check due right away
+    """
+
+    def __init__(self, min_interval=30, max_interval=600, factor=2):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+
+        self.interval = min_interval
+        self.next_check = time.time() + min_interval
+        self.last_status = None
+
+    def time_until_check(self):
+        return max(self.next_check - time.time(), 0)
+
+    def due(self):
+        return time.time() >= self.next_check
+
+    def checked(self, status):
+        if status != self.last_status:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.factor, self.max_interval)
+        self.last_status = status
+        self.next_check = time.time() + self.interval
+
+    def activity(self, lines):
+        if not lines:
+            return
+
+        self.interval = self.min_interval
+
+        if any(is_terminal_marker(v) for v in lines):
+            self.check_now()
+            return
+
+        self.next_check = min(self.next_check, time.time() + self.min_interval)
+
+    def check_now(self):
+        self.next_check = time.time()
@@ -2,7 +2,12 @@ import logging
 import os
 
 import mondrian_runner.utils as utils
+from mondrian_runner.critical_path import write_call_priorities
 from mondrian_runner.debug import debug
+from mondrian_runner.hold_release import HeldJobReleaser
+from mondrian_runner.job_groups import create_job_group
+from mondrian_runner.job_groups import get_job_group
+from mondrian_runner.usage_history import record_workflow_usage
 
 
 def write_delete_wdl(wdl_path, dirs_to_delete):
@@ -16,9 +21,7 @@ def write_delete_wdl(wdl_path, dirs_to_delete):
         writer.write(wdl_file_string)
 
 
-def delete_intermediates_workflow(
-        server_url, cache_dir, delete_cache_dir, wf_name, workflow_log_dir, execution_dir
-):
+def submit_delete_intermediates(server_url, cache_dir, delete_cache_dir, wf_name, execution_dir):
     run_ids = utils.get_all_ids_from_cache_dir(cache_dir)
     run_dirs = [os.path.join(execution_dir, wf_name, run_id) for run_id in run_ids]
 
@@ -29,6 +32,16 @@ def delete_intermediates_workflow(
 
     utils.cache_run_id(run_id, delete_cache_dir)
 
+    return run_id
+
+
+def delete_intermediates_workflow(
+        server_url, cache_dir, delete_cache_dir, wf_name, workflow_log_dir, execution_dir
+):
+    run_id = submit_delete_intermediates(
+        server_url, cache_dir, delete_cache_dir, wf_name, execution_dir
+    )
+
     logfile = os.path.join(workflow_log_dir, 'workflow.{}.log'.format(run_id))
     status = utils.wait(server_url, run_id, logfile)
 
@@ -37,10 +50,36 @@ def delete_intermediates_workflow(
     )
 
 
+def get_or_submit_run(
+        server_url, pipeline_wdl, input_json, options_json, cache_dir, imports=None,
+        try_reattach=None
+):
+    """
+    reattach to the latest run in the cache dir if it is still going or
+    succeeded, otherwise submit a new run
+    """
+    run_id = utils.get_latest_id_from_cache_dir(cache_dir)
+
+    status = None
+    if run_id is not None:
+        status = utils.check_status(server_url, run_id)
+
+    if run_id is None or try_reattach is False or status not in ['running', 'submitted', 'succeeded']:
+        run_id = utils.submit_pipeline(
+            server_url, pipeline_wdl, input_json=input_json, options_json=options_json,
+            imports=imports
+        )
+        utils.cache_run_id(run_id, cache_dir)
+
+    return run_id
+
+
 def runner(
         server_url, pipeline_wdl, input_json, options_json,
         cache_dir, mondrian_dir, imports=None, delete_intermediates=False,
-        try_reattach=None
+        try_reattach=None, usage_db=None, max_pending=None,
+        job_group_root=None, job_group_limit=None, critical_path_priority=False,
+        state_dir=None
 ):
     with utils.PipelineLock(cache_dir):
 
@@ -51,20 +90,31 @@ def runner(
 
         utils.makedirs(cache_dir)
 
-        run_id = utils.get_latest_id_from_cache_dir(cache_dir)
+        run_id = get_or_submit_run(
+            server_url, pipeline_wdl, input_json, options_json, cache_dir,
+            imports=imports, try_reattach=try_reattach
+        )
+
+        if job_group_root is not None:
+            create_job_group(get_job_group(job_group_root, run_id), limit=job_group_limit)
+
+        if critical_path_priority:
+            # read by generate_bsub_command, both sides must use the same state dir
+            write_call_priorities(run_id, pipeline_wdl, usage_db=usage_db, state_dir=state_dir)
 
-        status = None
-        if run_id is not None:
-            status = utils.check_status(server_url, run_id)
+        releaser = None
+        if max_pending is not None:
+            releaser = HeldJobReleaser(run_id, max_pending, state_dir=state_dir)
+            releaser.start()
 
-        if run_id is None or try_reattach is False or status not in ['running', 'submitted', 'succeeded']:
-            run_id = utils.submit_pipeline(
-                server_url, pipeline_wdl, input_json=input_json, options_json=options_json,
-                imports=imports
-            )
-            utils.cache_run_id(run_id, cache_dir)
+        try:
+            status = utils.wait(server_url, run_id, workflow_log_dir)
+        finally:
+            if releaser is not None:
+                releaser.stop()
 
-        status = utils.wait(server_url, run_id, workflow_log_dir)
+        if usage_db is not None:
+            record_workflow_usage(usage_db, os.path.join(execution_dir, wf_name, run_id))
 
         if status == 'succeeded':
             if delete_intermediates:
@@ -0,0 +1,171 @@
+import asyncio
+import csv
+import logging
+import os
+import sys
+import time
+
+import mondrian_runner.utils as utils
+from mondrian_runner.debug import debug
+from mondrian_runner.hold_release import HeldJobReleaser
+from mondrian_runner.run import get_or_submit_run
+from mondrian_runner.run import submit_delete_intermediates
+from mondrian_runner.workflow_monitor import WorkflowMonitor
+
+
+def read_manifest(manifest):
+    """
+    samples to run from a tsv (.tsv/.txt) or csv file with a header of
+    sample, input_json, options_json (optional) and cache_dir
+    """
+    delimiter = ',' if manifest.endswith('.csv') else '\t'
+
+    with open(manifest, 'rt') as reader:
+        samples = list(csv.DictReader(reader, delimiter=delimiter))
+
+    for sample in samples:
+        for column in ['sample', 'input_json', 'cache_dir']:
+            if not sample.get(column):
+                raise Exception('manifest row {} has no {}'.format(sample, column))
+        sample['options_json'] = sample.get('options_json') or None
+
+    return samples
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def write_summary(results, out):
+    out.write('sample\trun_id\tstatus\tduration\n')
+    for result in results:
+        out.write('{}\t{}\t{}\t{}\n'.format(
+            result['sample'], result['run_id'], result['status'],
+            format_duration(result['duration'])
+        ))
+
+    succeeded = len([v for v in results if v['status'] == 'succeeded'])
+    out.write('# {} succeeded, {} failed\n'.format(succeeded, len(results) - succeeded))
+
+
+class BatchRunner(object):
+    """
+    runs every sample of a manifest through one cromwell server, with at most
+    max_in_flight workflows submitted or running at a time, all followed by
+    one WorkflowMonitor
+    """
+
+    def __init__(
+            self, server_url, pipeline_wdl, mondrian_dir, imports=None, max_in_flight=20,
+            delete_intermediates=False, try_reattach=None, poll_interval=30,
+            max_poll_interval=300, max_pending=None, state_dir=None
+    ):
+        self.server_url = server_url
+        self.pipeline_wdl = pipeline_wdl
+        self.imports = imports
+        self.max_in_flight = max_in_flight
+        self.delete_intermediates = delete_intermediates
+        self.try_reattach = try_reattach
+        self.max_pending = max_pending
+        self.state_dir = state_dir
+
+        self.execution_dir = os.path.join(mondrian_dir, 'cromwell-executions')
+        self.workflow_log_dir = os.path.join(mondrian_dir, 'cromwell-workflow-logs')
+
+        self.monitor = WorkflowMonitor(
+            server_url, workflow_log_dir=self.workflow_log_dir, poll_interval=poll_interval,
+            max_poll_interval=max_poll_interval
+        )
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+    async def run_sample(self, sample, semaphore):
+        logger = logging.getLogger('mondrian_runner.run_batch')
+
+        result = {'sample': sample['sample'], 'run_id': None, 'status': None, 'duration': 0}
+
+        async with semaphore:
+            start = time.time()
+            utils.makedirs(sample['cache_dir'])
+
+            try:
+                with utils.PipelineLock(sample['cache_dir']):
+                    await self._run_and_cleanup(sample, result)
+            except Exception:
+                logger.exception('{} failed'.format(sample['sample']))
+                result['status'] = result['status'] or 'error'
+
+            result['duration'] = time.time() - start
+
+        return result
+
+    async def _run_and_cleanup(self, sample, result):
+        logger = logging.getLogger('mondrian_runner.run_batch')
+
+        wf_name = utils.get_wf_name_from_input_json(sample['input_json'])
+
+        run_id = await self._run_blocking(
+            get_or_submit_run, self.server_url, self.pipeline_wdl, sample['input_json'],
+            sample['options_json'], sample['cache_dir'], imports=self.imports,
+            try_reattach=self.try_reattach
+        )
+        result['run_id'] = run_id
+        logger.info('{}: following run {}'.format(sample['sample'], run_id))
+
+        # jobs generate_bsub_command --max_pending submitted held
+        releaser = None
+        if self.max_pending is not None:
+            releaser = HeldJobReleaser(run_id, self.max_pending, state_dir=self.state_dir)
+            releaser.start()
+
+        try:
+            result['status'] = await self.monitor.wait(run_id)
+        finally:
+            if releaser is not None:
+                releaser.stop()
+        logger.info('{}: {}'.format(sample['sample'], result['status']))
+
+        if result['status'] != 'succeeded':
+            await self._run_blocking(debug, self.execution_dir, wf_name, run_id)
+            return
+
+        if self.delete_intermediates:
+            delete_cache_dir = os.path.join(sample['cache_dir'], 'remove_intermediates')
+            utils.makedirs(delete_cache_dir)
+            cleanup_id = await self._run_blocking(
+                submit_delete_intermediates, self.server_url, sample['cache_dir'],
+                delete_cache_dir, wf_name, self.execution_dir
+            )
+            cleanup_status = await self.monitor.wait(cleanup_id)
+            logger.info('{}: cleanup status: {}'.format(sample['sample'], cleanup_status))
+
+    async def run(self, samples):
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        return await asyncio.gather(*[self.run_sample(v, semaphore) for v in samples])
+
+
+def run_batch(
+        server_url, pipeline_wdl, manifest, mondrian_dir, imports=None, max_in_flight=20,
+        delete_intermediates=False, try_reattach=None, poll_interval=30,
+        max_poll_interval=300, max_pending=None, state_dir=None, summary=None
+):
+    samples = read_manifest(manifest)
+
+    batch_runner = BatchRunner(
+        server_url, pipeline_wdl, mondrian_dir, imports=imports, max_in_flight=max_in_flight,
+        delete_intermediates=delete_intermediates, try_reattach=try_reattach,
+        poll_interval=poll_interval, max_poll_interval=max_poll_interval,
+        max_pending=max_pending, state_dir=state_dir
+    )
+    results = asyncio.run(batch_runner.run(samples))
+
+    if summary is not None:
+        with open(summary, 'wt') as writer:
+            write_summary(results, writer)
+
+    write_summary(results, sys.stdout)
+
+    return results
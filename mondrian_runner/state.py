@@ -0,0 +1,61 @@
+import contextlib
+import errno
+import fcntl
+import getpass
+import json
+import os
+
+
+def get_state_dir(state_dir=None):
+    """
+    directory for state shared between runner processes on this host,
+    defaults to $MONDRIAN_RUNNER_STATE_DIR or a per user dir under tmp
+    :param state_dir: override directory
+    :type state_dir: str
+    """
+    if state_dir is None:
+        state_dir = os.environ.get('MONDRIAN_RUNNER_STATE_DIR')
+
+    if state_dir is None:
+        # tempfile is slow to import, keep it off the check_alive path
+        import tempfile
+        state_dir = os.path.join(
+            tempfile.gettempdir(), 'mondrian_runner_{}'.format(getpass.getuser())
+        )
+
+    os.makedirs(state_dir, exist_ok=True)
+
+    return state_dir
+
+
+def atomic_write_json(path, data):
+    """
+    write to a tmp file and rename it into place, so readers in other
+    processes never see a partially written file
+    """
+    path_tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(path_tmp, 'wt') as writer:
+        json.dump(data, writer)
+    os.rename(path_tmp, path)
+
+
+@contextlib.contextmanager
+def locked(lock_file, blocking=True):
+    """
+    hold an exclusive flock on lock_file for the block. with blocking=False
+    yields False right away if another process holds the lock
+    """
+    with open(lock_file, 'at') as lock:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock, flags)
+        except OSError as e:
+            if blocking or e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
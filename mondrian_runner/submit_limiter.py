@@ -0,0 +1,99 @@
+import json
+import os
+import random
+import subprocess
+import time
+
+from mondrian_runner.state import atomic_write_json
+from mondrian_runner.state import get_state_dir
+from mondrian_runner.state import locked
+
+
+class SubmitLimiter(object):
+    """
+    token bucket shared by all bsub calls on this host. tokens refill at
+    rate per second up to burst, the bucket is a json file updated under an flock.
+    time spent waiting is appended to submit_waits.tsv for tuning.
+    """
+
+    def __init__(self, rate, burst=10, state_dir=None):
+        self.rate = rate
+        self.burst = burst
+
+        limiter_dir = os.path.join(get_state_dir(state_dir), 'submit_limiter')
+        os.makedirs(limiter_dir, exist_ok=True)
+
+        self.bucket_file = os.path.join(limiter_dir, 'bucket.json')
+        self.lock_file = os.path.join(limiter_dir, 'bucket.lock')
+        self.waits_file = os.path.join(limiter_dir, 'submit_waits.tsv')
+
+    def _take_token(self):
+        """
+        returns 0 if a token was taken, else the seconds until one is available
+        """
+        with locked(self.lock_file):
+            now = time.time()
+
+            tokens = self.burst
+            if os.path.exists(self.bucket_file):
+                with open(self.bucket_file, 'rt') as reader:
+                    bucket = json.load(reader)
+                tokens = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * self.rate)
+
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+
+            atomic_write_json(self.bucket_file, {'tokens': tokens, 'updated': now})
+
+        return wait
+
+    def acquire(self):
+        """
+        block until a token is available, returns the seconds waited
+        """
+        start = time.time()
+
+        wait = self._take_token()
+        while wait > 0:
+            # jitter so waiting processes do not all retry at the same time
+            time.sleep(wait + random.uniform(0, 1.0 / self.rate))
+            wait = self._take_token()
+
+        return time.time() - start
+
+    def record_wait(self, job_name, wait, retries):
+        with open(self.waits_file, 'at') as writer:
+            writer.write('{}\t{}\t{:.3f}\t{}\n'.format(time.time(), job_name, wait, retries))
+
+
+def run_bsub(cmd, job_name, limiter=None, retries=3, backoff=5):
+    """
+    run bsub, retrying failed calls (e.g. mbatchd timeouts) with jittered
+    exponential backoff. returns bsub stdout
+    """
+    cmd = [str(v) for v in cmd]
+
+    wait = 0
+    attempt = 0
+    while True:
+        if limiter is not None:
+            wait += limiter.acquire()
+
+        try:
+            stdout = subprocess.check_output(cmd).decode()
+            break
+        except subprocess.CalledProcessError:
+            if attempt == retries:
+                raise
+            sleep = backoff * 2 ** attempt + random.uniform(0, backoff)
+            time.sleep(sleep)
+            wait += sleep
+            attempt += 1
+
+    if limiter is not None:
+        limiter.record_wait(job_name, wait, attempt)
+
+    return stdout
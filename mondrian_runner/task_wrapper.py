@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from mondrian_runner import utils
+from mondrian_runner.image_cache import ImageCache
+from mondrian_runner.state import atomic_write_json
+
+
+def write_task(
+        cwd, docker_cwd, container_cmd, singularity_img, scratch=False,
+        image_cache_dir=None, image_cache_gb=50
+):
+    """
+    save what the node needs to run the task on local scratch and/or from a
+    node local image copy, returns the wrapper command that bsub (or a job
+    array element) runs instead of the container
+    """
+    task_file = os.path.join(cwd, 'execution', 'task.json')
+
+    task = {
+        'cwd': cwd, 'docker_cwd': docker_cwd, 'cmd': container_cmd,
+        'singularity_img': singularity_img, 'scratch': scratch,
+        'image_cache_dir': image_cache_dir, 'image_cache_gb': image_cache_gb
+    }
+
+    atomic_write_json(task_file, task)
+
+    return [utils.get_runner_executable(), 'run_task', '--task', task_file]
+
+
+def stage_in(cwd, scratch_dir):
+    """
+    copy the call dir to scratch. inputs are soft links so only the links are
+    copied, cromwell's tmp dirs and everything the task writes stay on local disk
+    """
+    for name in os.listdir(cwd):
+        src = os.path.join(cwd, name)
+        dst = os.path.join(scratch_dir, name)
+        if os.path.isdir(src) and not os.path.islink(src):
+            shutil.copytree(src, dst, symlinks=True)
+        else:
+            shutil.copy2(src, dst, follow_symlinks=False)
+
+
+def stage_out(scratch_dir, cwd):
+    """
+    copy the execution dir with the task outputs back to shared storage.
+    cromwell treats the rc file as the end of the task so it is copied last
+    """
+    src_dir = os.path.join(scratch_dir, 'execution')
+    dst_dir = os.path.join(cwd, 'execution')
+
+    for name in os.listdir(src_dir):
+        # job_information.json is updated on shared storage by check_alive while the task runs
+        if name in ('rc', 'rc.tmp', 'job_information.json', 'task.json'):
+            continue
+        src = os.path.join(src_dir, name)
+        dst = os.path.join(dst_dir, name)
+        if os.path.isdir(src) and not os.path.islink(src):
+            shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+        else:
+            shutil.copy2(src, dst, follow_symlinks=False)
+
+    rcfile = os.path.join(src_dir, 'rc')
+    if os.path.exists(rcfile):
+        shutil.copy2(rcfile, os.path.join(dst_dir, 'rc.tmp'))
+        os.rename(os.path.join(dst_dir, 'rc.tmp'), os.path.join(dst_dir, 'rc'))
+
+
+def run_task(task_file):
+    """
+    runs on the compute node, executes the container from the node local
+    image cache and/or with its working directory on node local scratch
+    ($TMPDIR), staging outputs back
+    """
+    with open(task_file, 'rt') as reader:
+        task = json.load(reader)
+
+    cmd = task['cmd']
+
+    if task['image_cache_dir'] is not None:
+        image = ImageCache(task['image_cache_dir'], max_gb=task['image_cache_gb']).get(
+            task['singularity_img']
+        )
+        cmd = [image if v == task['singularity_img'] else v for v in cmd]
+
+    if not task['scratch']:
+        os.chdir(task['cwd'])
+        sys.exit(subprocess.call(cmd))
+
+    scratch_dir = tempfile.mkdtemp(prefix='mondrian_', dir=os.environ.get('TMPDIR'))
+
+    try:
+        stage_in(task['cwd'], scratch_dir)
+
+        # bind scratch instead of the shared call dir into the container
+        bind = '{}:{}'.format(task['cwd'], task['docker_cwd'])
+        scratch_bind = '{}:{}'.format(scratch_dir, task['docker_cwd'])
+        cmd = [scratch_bind if v == bind else v for v in cmd]
+
+        returncode = subprocess.call(cmd)
+
+        # also after a failure, so stdout/stderr are there for debugging
+        stage_out(scratch_dir, task['cwd'])
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    sys.exit(returncode)
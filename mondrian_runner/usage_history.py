@@ -0,0 +1,206 @@
+import json
+import math
+import os
+import sqlite3
+import time
+
+from mondrian_runner.lsf import JobRecord
+from mondrian_runner.lsf import query_job_history
+from mondrian_runner.lsf import query_jobs
+
+
+def get_task_name(cwd):
+    """
+    fully qualified task name (workflow.task) from a cromwell call dir such as
+    cromwell-executions/<workflow>/<run_id>/call-<task>/shard-1/attempt-2
+    """
+    parts = cwd.rstrip('/').split('/')
+
+    call_idx = [i for i, v in enumerate(parts) if v.startswith('call-')]
+    if not call_idx:
+        return None
+    call_idx = call_idx[-1]
+
+    task = parts[call_idx][len('call-'):]
+    if call_idx >= 2:
+        task = '{}.{}'.format(parts[call_idx - 2], task)
+
+    return task
+
+
+def get_input_size(cwd):
+    """
+    total size in bytes of the files cromwell localized for the task
+    """
+    inputs_dir = os.path.join(cwd, 'inputs')
+
+    total = 0
+    for root, dirs, files in os.walk(inputs_dir):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                # dangling link
+                continue
+    return total
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    idx = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[max(idx, 0)]
+
+
+class UsageHistory(object):
+    """
+    sqlite table of requested and observed resources per lsf job,
+    keyed by task name so first attempts can be sized from past runs.
+    uses the default rollback journal, the db often sits on a network
+    filesystem where wal does not work
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'job_id TEXT PRIMARY KEY, task TEXT, cwd TEXT, cpu INTEGER, '
+            'memory_gb REAL, walltime TEXT, input_bytes INTEGER, '
+            'max_mem REAL, run_time REAL, status TEXT, updated REAL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_task ON jobs (task)')
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def record_request(self, job_id, cwd, cpu, memory_gb, walltime, input_bytes=None):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO jobs '
+                '(job_id, task, cwd, cpu, memory_gb, walltime, input_bytes, status, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, get_task_name(cwd), cwd, cpu, memory_gb, walltime,
+                 input_bytes, 'PEND', time.time())
+            )
+
+    def record_usage(self, job_id, max_mem, run_time, status=None):
+        self.record_usages([(job_id, max_mem, run_time, status)])
+
+    def record_usages(self, usages):
+        """
+        update many jobs in one transaction
+        :param usages: (job_id, max_mem, run_time, status) tuples
+        :type usages: list
+        """
+        now = time.time()
+        # peak memory only grows, keep the largest value seen so far
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE jobs SET max_mem = MAX(COALESCE(max_mem, 0), COALESCE(?, 0)), '
+                'run_time = COALESCE(?, run_time), status = COALESCE(?, status), '
+                'updated = ? WHERE job_id = ?',
+                [(max_mem, run_time, status, now, job_id)
+                 for job_id, max_mem, run_time, status in usages]
+            )
+
+    def get_successful_usage(self, task):
+        rows = self.conn.execute(
+            'SELECT max_mem, run_time, input_bytes FROM jobs '
+            'WHERE task = ? AND status = ? AND max_mem > 0 AND run_time > 0',
+            (task, 'DONE')
+        )
+        return rows.fetchall()
+
+
+def record_snapshot_usage(db_path, records):
+    """
+    usage of all running and finished jobs in a bjobs snapshot, one write per snapshot
+    :param records: JobRecord by job id
+    :type records: dict
+    """
+    usages = []
+    for job_id, record in records.items():
+        if record.status not in ['RUN', 'DONE', 'EXIT']:
+            continue
+        status = None if record.status == 'RUN' else record.status
+        usages.append((job_id, record.max_mem, record.run_time, status))
+
+    with UsageHistory(db_path) as history:
+        history.record_usages(usages)
+
+
+def record_workflow_usage(db_path, run_dir):
+    """
+    final accounting for all lsf jobs of a finished workflow from bjobs, or from
+    bhist/bacct for jobs bjobs has purged. status comes from the rc file
+    """
+    jobs = {}
+    for root, dirs, files in os.walk(run_dir):
+        if 'job_information.json' not in files:
+            continue
+        with open(os.path.join(root, 'job_information.json'), 'rt') as reader:
+            job_id = json.load(reader)['job_id']
+
+        rcfile = os.path.join(root, 'rc')
+        if not os.path.exists(rcfile):
+            continue
+        with open(rcfile, 'rt') as reader:
+            status = 'DONE' if reader.read().strip() == '0' else 'EXIT'
+
+        jobs[job_id] = status
+
+    records = query_jobs(list(jobs.keys()))
+    purged = query_job_history([v for v in jobs if v not in records])
+
+    with UsageHistory(db_path) as history:
+        for job_id, status in jobs.items():
+            max_mem = run_time = None
+            if job_id in records:
+                record = JobRecord(records[job_id])
+                max_mem, run_time = record.max_mem, record.run_time
+            elif job_id in purged:
+                max_mem, run_time = purged[job_id]['max_mem'], purged[job_id]['run_time']
+            history.record_usage(job_id, max_mem, run_time, status=status)
+
+
+def right_size_request(
+        db_path, cwd, cpu, memory_gb, walltime_mins, input_bytes=None,
+        pct=95, headroom=1.5, min_samples=10
+):
+    """
+    size a first attempt from a high percentile of past successful runs of the
+    same task, scaled up for inputs larger than usual. never exceeds the
+    request from the wdl. returns memory per cpu in GB and walltime in minutes
+    """
+    task = get_task_name(cwd)
+    if task is None:
+        return memory_gb, walltime_mins
+
+    with UsageHistory(db_path) as history:
+        usage = history.get_successful_usage(task)
+
+    if len(usage) < min_samples:
+        return memory_gb, walltime_mins
+
+    max_mem = percentile([v[0] for v in usage], pct)
+    run_time = percentile([v[1] for v in usage], pct)
+
+    past_inputs = [v[2] for v in usage if v[2]]
+    if input_bytes and len(past_inputs) == len(usage):
+        scale = input_bytes / float(percentile(past_inputs, 50))
+        max_mem *= max(scale, 1)
+        run_time *= max(scale, 1)
+
+    new_memory_gb = int(math.ceil(max_mem * headroom / cpu))
+    new_walltime_mins = int(math.ceil(run_time * headroom / 60))
+
+    return (
+        max(min(memory_gb, new_memory_gb), 1),
+        max(min(walltime_mins, new_walltime_mins), 1),
+    )
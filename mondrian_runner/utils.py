@@ -4,36 +4,25 @@ import json
 import logging
 import os
 import random
+import shutil
+import sys
 from subprocess import Popen, PIPE, STDOUT
 
 import time
 
 
 def submit_pipeline(server_url, wdl_file, input_json=None, options_json=None, imports=None):
-    logger = logging.getLogger('mondrian_runner.submit')
-
-    cmd = [
-        'curl',
-        '-X', 'POST',
-        '--header', 'Accept: application/json',
-        '-v', '{}/api/workflows/v1'.format(server_url),
-        '-F', 'workflowSource=@{}'.format(wdl_file),
-    ]
-
-    if input_json is not None:
-        cmd += ['-F', 'workflowInputs=@{}'.format(input_json)]
-
-    if options_json is not None:
-        cmd += ['-F', 'workflowOptions=@{}'.format(options_json)]
+    from mondrian_runner.cromwell_client import get_client
 
-    if imports is not None:
-        cmd += ['-F', 'workflowDependencies=@{}'.format(imports)]
+    logger = logging.getLogger('mondrian_runner.submit')
 
-    logger.info('running: {}'.format(' '.join(cmd)))
+    client = get_client(server_url)
 
-    cmdout, cmderr = run_cmd(cmd)
+    logger.info('submitting {} to {}'.format(wdl_file, client.server_url))
 
-    run_id = get_run_id(cmdout)
+    run_id = client.submit(
+        wdl_file, input_json=input_json, options_json=options_json, imports=imports
+    )
 
     logger.info("run_id: {}".format(run_id))
 
@@ -151,30 +140,26 @@ def get_run_id(stdout):
     return run_id
 
 
-def check_status(server_url, run_id, num_retries=0):
-    i = 0
-    while i <= num_retries:
-        cmd = ['curl', '-X', 'GET', "http://{}/api/workflows/v1/query?id={}".format(server_url, run_id)]
+def check_status(server_url, run_id, num_retries=0, backoff=5, max_backoff=60):
+    from mondrian_runner.cromwell_client import get_client
 
-        cmdout, cmderr = run_cmd(cmd)
+    logger = logging.getLogger('mondrian_runner.poll')
 
-        cmdout = json.loads(cmdout)
+    i = 0
+    while i <= num_retries:
+        cmdout = get_client(server_url).query([run_id])
 
         if 'results' not in cmdout:
-            logging.getLogger('mondrian_runner.poll').warning(f'expected results in response, received {cmdout}')
-            i += 1
-            time.sleep(20)
-            continue
-
-        if not len(cmdout['results']) == 1:
-            logging.getLogger('mondrian_runner.poll').warning('expected 1 result. {}'.format(cmdout['results']))
-            i += 1
-            time.sleep(20)
-            continue
-
-        status = cmdout['results'][0]['status'].lower()
+            logger.warning(f'expected results in response, received {cmdout}')
+        elif not len(cmdout['results']) == 1:
+            logger.warning('expected 1 result. {}'.format(cmdout['results']))
+        else:
+            return cmdout['results'][0]['status'].lower()
 
-        return status
+        # a workflow that was just submitted may not be listed yet
+        if i < num_retries:
+            time.sleep(min(backoff * 2 ** i, max_backoff) + random.uniform(0, 1))
+        i += 1
 
 
 def makedirs(directory):
@@ -190,6 +175,19 @@ def makedirs(directory):
             raise
 
 
+def get_runner_executable():
+    """
+    path to the mondrian_runner script, for commands that run on compute nodes
+    """
+    if os.path.basename(sys.argv[0]) == 'mondrian_runner':
+        return os.path.abspath(sys.argv[0])
+
+    executable = shutil.which('mondrian_runner')
+    if executable is None:
+        raise Exception('unable to find the mondrian_runner executable')
+    return executable
+
+
 def get_wf_name(execution_dir, run_id):
     paths = glob.glob('{}/*/{}'.format(execution_dir, run_id))
 
@@ -241,36 +239,62 @@ class PipelineLock(object):
         os.rmdir(self.lock)
 
 
-def _simple_wait_and_log(server_url, run_id, workflow_log_dir, sleep_time=30):
+def _simple_wait_and_log(server_url, run_id, workflow_log_dir, sleep_time=30, max_sleep_time=300):
+    """
+    print the workflow log as it is written and check the status, every
+    sleep_time seconds while the log is active, backing off to max_sleep_time
+    while nothing changes, and right away when the log reports the end of the
+    run or is removed
+    """
+    from mondrian_runner.log_follower import LogFollower
+    from mondrian_runner.poll_scheduler import PollScheduler
+
     log_file = os.path.join(workflow_log_dir, 'workflow.{}.log'.format(run_id))
     logger = logging.getLogger('mondrian_runner.poll')
 
-    if not os.path.exists(log_file):
-        return check_status(server_url, run_id, num_retries=4)
+    follower = LogFollower(log_file)
+    scheduler = PollScheduler(min_interval=sleep_time, max_interval=max_sleep_time)
 
-    logreader = open(log_file, 'rt')
-    logreader.seek(0, os.SEEK_END)
+    try:
+        status = None
+        log_present = follower.exists()
+        while True:
+            lines = follower.read_lines()
+            for line in lines:
+                logger.info(line.strip())
+            scheduler.activity(lines)
+
+            if log_present and not follower.exists():
+                # cromwell removes the log at the end of the run, check now
+                log_present = False
+                scheduler.check_now()
+
+            if scheduler.due():
+                status = check_status(server_url, run_id, num_retries=4)
+                scheduler.checked(status)
+                if status not in ['running', 'submitted']:
+                    break
 
-    status = None
-    while os.path.exists(log_file) or status in ['running', 'submitted']:
-        line = logreader.readline()
-        if line:
+            follower.wait(scheduler.time_until_check())
+    finally:
+        for line in follower.read_lines():
             logger.info(line.strip())
-        else:
-            status = check_status(server_url, run_id, num_retries=4)
-            time.sleep(sleep_time)
+        follower.close()
 
-    return check_status(server_url, run_id, num_retries=4)
+    return status
 
 
-def wait(server_url, run_id, workflow_log_dir, sleep_time=30):
+def wait(server_url, run_id, workflow_log_dir, sleep_time=30, max_sleep_time=300):
     x = 0
     num_retries = 5
     backoff_in_seconds = 10
 
     while True:
         try:
-            status = _simple_wait_and_log(server_url, run_id, workflow_log_dir, sleep_time=sleep_time)
+            status = _simple_wait_and_log(
+                server_url, run_id, workflow_log_dir, sleep_time=sleep_time,
+                max_sleep_time=max_sleep_time
+            )
             if status not in ['running', 'submitted']:
                 return status
         except KeyboardInterrupt:
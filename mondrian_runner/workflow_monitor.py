@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+
+from mondrian_runner.cromwell_client import get_client
+from mondrian_runner.log_follower import LogFollower
+from mondrian_runner.poll_scheduler import PollScheduler
+
+ACTIVE_STATUSES = ['running', 'submitted']
+
+
+class WorkflowMonitor(object):
+    """
+    follows any number of workflows from one process. status checks for all
+    workflows that are still active go out as batched query requests with
+    one id= parameter per run over a single shared connection, and each
+    workflow log is tailed into the logger. polls back off towards
+    max_poll_interval while no status changes and no log is written to.
+    """
+
+    def __init__(
+            self, server_url, workflow_log_dir=None, poll_interval=30, batch_size=100,
+            log_interval=1, max_poll_interval=300
+    ):
+        self.client = get_client(server_url)
+        self.workflow_log_dir = workflow_log_dir
+        self.poll_interval = poll_interval
+        self.scheduler = PollScheduler(min_interval=poll_interval, max_interval=max_poll_interval)
+        self.batch_size = batch_size
+        self.log_interval = log_interval
+
+        self.statuses = {}
+        self._waiting = {}
+        self._poller = None
+        self._wake = None
+
+    async def _query(self, run_ids):
+        # the client blocks, keep it off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.client.query, run_ids)
+
+    async def _poll(self):
+        logger = logging.getLogger('mondrian_runner.monitor')
+
+        while self._waiting:
+            run_ids = list(self._waiting)
+            for i in range(0, len(run_ids), self.batch_size):
+                try:
+                    response = await self._query(run_ids[i:i + self.batch_size])
+                except Exception:
+                    logger.exception('status query failed, retrying at the next poll')
+                    continue
+
+                for result in response.get('results', []):
+                    status = result['status'].lower()
+                    self.statuses[result['id']] = status
+                    if status not in ACTIVE_STATUSES and result['id'] in self._waiting:
+                        self._waiting.pop(result['id']).set_result(status)
+
+            self.scheduler.checked(tuple(sorted(self.statuses.items())))
+
+            # the log tails wake the poller when the next check is brought forward
+            while self._waiting and not self.scheduler.due():
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.scheduler.time_until_check())
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _tail_log(self, run_id, done):
+        logger = logging.getLogger('mondrian_runner.monitor')
+        log_file = os.path.join(self.workflow_log_dir, 'workflow.{}.log'.format(run_id))
+
+        # polled from the event loop, so no inotify watch per workflow
+        follower = LogFollower(log_file, min_poll_interval=self.log_interval, inotify=False)
+
+        try:
+            while True:
+                lines = follower.read_lines()
+                for line in lines:
+                    logger.info('{}: {}'.format(run_id[:8], line.strip()))
+                if lines:
+                    self.scheduler.activity(lines)
+                    self._wake.set()
+
+                if done.done():
+                    break
+                await asyncio.sleep(follower.backoff())
+        finally:
+            follower.close()
+
+    async def wait(self, run_id):
+        """
+        wait for a workflow to leave the running/submitted states, returns its status
+        """
+        done = asyncio.get_running_loop().create_future()
+        self._waiting[run_id] = done
+
+        if self._wake is None:
+            self._wake = asyncio.Event()
+
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+
+        tail = None
+        if self.workflow_log_dir is not None:
+            tail = asyncio.ensure_future(self._tail_log(run_id, done))
+
+        status = await done
+        if tail is not None:
+            await tail
+
+        return status
+
+    async def wait_all(self, run_ids):
+        statuses = await asyncio.gather(*[self.wait(v) for v in run_ids])
+        return dict(zip(run_ids, statuses))
+
+
+def monitor_workflows(
+        server_url, run_ids, workflow_log_dir=None, poll_interval=30, max_poll_interval=300
+):
+    """
+    block until all workflows finish, returns a dict of run id to final status
+    """
+    monitor = WorkflowMonitor(
+        server_url, workflow_log_dir=workflow_log_dir, poll_interval=poll_interval,
+        max_poll_interval=max_poll_interval
+    )
+    return asyncio.run(monitor.wait_all(run_ids))
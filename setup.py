@@ -14,5 +14,5 @@ setup(
             'mondrian_runner = mondrian_runner.main:main',
         ]
     },
-    package_data={'': ['*.py']}
+    package_data={'': ['*.py'], 'mondrian_runner': ['data/*']}
 )
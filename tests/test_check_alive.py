@@ -0,0 +1,62 @@
+import io
+import json
+import os
+import stat
+
+from mondrian_runner.check_alive import extend_walltime
+from mondrian_runner.lsf import JobRecord
+
+
+def write_bmod(bin_dir, script):
+    bmod = bin_dir.join('bmod')
+    bmod.write('#!/bin/sh\n' + script)
+    os.chmod(str(bmod), stat.S_IRWXU)
+
+
+def get_record(cwd):
+    return JobRecord({
+        'JOBID': '4211873', 'STAT': 'RUN', 'RUN_TIME': '13000 second(s)',
+        'RUNTIMELIMIT': '240.0/ls05', 'EXEC_CWD': str(cwd)
+    })
+
+
+def write_job_information(cwd):
+    cwd.mkdir('execution')
+    cwd.join('execution', 'job_information.json').write(json.dumps(
+        {'job_id': '4211873', 'walltime': '4:00', 'memory_gb': 6, 'attempt': 1}
+    ))
+
+
+def read_job_information(cwd):
+    return json.loads(cwd.join('execution', 'job_information.json').read())
+
+
+def test_extend_walltime(tmpdir, monkeypatch):
+    write_bmod(tmpdir, 'echo "Parameters of job <$3> are being changed"\n')
+    monkeypatch.setenv('PATH', '{}:{}'.format(tmpdir, os.environ['PATH']))
+    cwd = tmpdir.mkdir('call-bwa_align')
+    write_job_information(cwd)
+
+    walltime = extend_walltime('4211873', get_record(cwd), 24, out=io.StringIO())
+
+    assert walltime == '8:00'
+    job_info = read_job_information(cwd)
+    assert job_info['walltime'] == '8:00'
+    assert len(job_info['walltime_extensions']) == 1
+
+
+def test_extend_walltime_bmod_fails(tmpdir, monkeypatch, capsys):
+    write_bmod(tmpdir, 'echo "4211873: Job has already finished" >&2\nexit 255\n')
+    monkeypatch.setenv('PATH', '{}:{}'.format(tmpdir, os.environ['PATH']))
+    cwd = tmpdir.mkdir('call-bwa_align')
+    write_job_information(cwd)
+    out = io.StringIO()
+
+    walltime = extend_walltime('4211873', get_record(cwd), 24, out=out)
+
+    assert walltime is None
+    assert out.getvalue() == ''
+    assert 'Job has already finished' in capsys.readouterr().err
+    job_info = read_job_information(cwd)
+    assert job_info['walltime'] == '4:00'
+    assert 'walltime_extensions' not in job_info
@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from mondrian_runner.cromwell_client import CromwellClient
+from mondrian_runner.cromwell_client import CromwellError
+
+
+class StubCromwellHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+
+        server = self.server
+        server.requests.append({
+            'method': self.command, 'path': self.path, 'body': body,
+            'client_port': self.client_address[1]
+        })
+
+        if server.delay:
+            time.sleep(server.delay.pop(0))
+        if server.errors:
+            self._send(server.errors.pop(0), {'status': 'error'})
+            return
+
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/api/workflows/v1':
+            self._send(201, {'id': 'run-1', 'status': 'Submitted'})
+        elif url.path == '/api/workflows/v1/query':
+            run_ids = [v for k, v in urllib.parse.parse_qsl(url.query) if k == 'id']
+            self._send(200, {'results': [{'id': v, 'status': 'Running'} for v in run_ids]})
+        elif url.path.endswith('/abort'):
+            self._send(200, {'id': url.path.split('/')[-2], 'status': 'Aborting'})
+        else:
+            self._send(404, {'status': 'fail'})
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubCromwellHandler)
+    server.daemon_threads = True
+    server.requests = []
+    # per request, in order: seconds to wait before answering and error codes to answer with
+    server.delay = []
+    server.errors = []
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_client(server, **kwargs):
+    kwargs.setdefault('backoff', 0)
+    return CromwellClient('127.0.0.1:{}'.format(server.server_address[1]), **kwargs)
+
+
+def test_query_batches_ids_on_one_connection(server):
+    client = get_client(server)
+
+    for _ in range(3):
+        response = client.query(['a', 'b'])
+        assert [v['id'] for v in response['results']] == ['a', 'b']
+
+    assert len(server.requests) == 3
+    assert len(set(v['client_port'] for v in server.requests)) == 1
+
+
+def test_query_retried_on_server_error(server):
+    server.errors = [500, 503]
+    client = get_client(server)
+
+    response = client.query(['a'])
+
+    assert response['results'][0]['status'] == 'Running'
+    assert len(server.requests) == 3
+
+
+def test_query_gives_up_after_retries(server):
+    server.errors = [500] * 3
+    client = get_client(server, retries=2)
+
+    with pytest.raises(CromwellError):
+        client.query(['a'])
+    assert len(server.requests) == 3
+
+
+def test_submit_streams_files(server, tmpdir):
+    wdl_file = tmpdir.join('pipeline.wdl')
+    wdl_file.write('workflow pipeline {}')
+    input_json = tmpdir.join('inputs.json')
+    input_json.write('{"pipeline.sample": "a"}')
+
+    client = get_client(server)
+    run_id = client.submit(str(wdl_file), input_json=str(input_json))
+
+    assert run_id == 'run-1'
+    body = server.requests[0]['body']
+    assert b'name="workflowSource"; filename="pipeline.wdl"' in body
+    assert b'workflow pipeline {}' in body
+    assert b'name="workflowInputs"; filename="inputs.json"' in body
+    assert b'workflowOptions' not in body
+
+
+def test_submit_not_retried_after_timeout(server, tmpdir):
+    wdl_file = tmpdir.join('pipeline.wdl')
+    wdl_file.write('workflow pipeline {}')
+
+    # the server takes the submission but answers after the client gave up
+    server.delay = [1.5]
+    client = get_client(server, timeout=0.5)
+
+    with pytest.raises(OSError):
+        client.submit(str(wdl_file))
+
+    time.sleep(1.5)
+    assert len([v for v in server.requests if v['method'] == 'POST']) == 1
+
+
+def test_submit_not_retried_on_server_error(server, tmpdir):
+    wdl_file = tmpdir.join('pipeline.wdl')
+    wdl_file.write('workflow pipeline {}')
+
+    server.errors = [503]
+    client = get_client(server)
+
+    with pytest.raises(CromwellError):
+        client.submit(str(wdl_file))
+    assert len(server.requests) == 1
+
+
+def test_submit_after_query_uses_new_connection(server, tmpdir):
+    wdl_file = tmpdir.join('pipeline.wdl')
+    wdl_file.write('workflow pipeline {}')
+
+    client = get_client(server)
+    client.query(['a'])
+    client.submit(str(wdl_file))
+    client.query(['a'])
+
+    ports = [v['client_port'] for v in server.requests]
+    assert ports[0] != ports[1]
+    assert ports[1] == ports[2]
+
+
+def test_unreachable_server_raises():
+    client = CromwellClient('127.0.0.1:1', retries=2, backoff=0, timeout=1)
+
+    with pytest.raises(ConnectionRefusedError):
+        client.abort('run-1')
+
+
+def test_abort(server):
+    client = get_client(server)
+
+    response = client.abort('run-1')
+
+    assert response['status'] == 'Aborting'
+    assert server.requests[0]['method'] == 'POST'
+    assert server.requests[0]['path'] == '/api/workflows/v1/run-1/abort'
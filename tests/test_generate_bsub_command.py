@@ -0,0 +1,57 @@
+import pytest
+
+from mondrian_runner.generate_bsub_command import ESCALATE_BOTH
+from mondrian_runner.generate_bsub_command import ESCALATE_MEMORY
+from mondrian_runner.generate_bsub_command import ESCALATE_WALLTIME
+from mondrian_runner.generate_bsub_command import RESUBMIT
+from mondrian_runner.generate_bsub_command import classify_exit_reason
+from mondrian_runner.generate_bsub_command import parse_queue_tiers
+from mondrian_runner.generate_bsub_command import select_queue_tier
+
+TIERS = 'short:64:2,medium:256:48,long:512:168'
+
+
+@pytest.mark.parametrize('fail_reason,policy', [
+    ('TERM_RUNLIMIT: job killed after reaching LSF run time limit', ESCALATE_WALLTIME),
+    ('TERM_CPULIMIT', ESCALATE_WALLTIME),
+    ('TERM_MEMLIMIT: job killed after reaching LSF memory usage limit', ESCALATE_MEMORY),
+    ('TERM_SWAP', ESCALATE_MEMORY),
+    ('TERM_HOST', RESUBMIT),
+    ('TERM_OWNER: job killed by owner', RESUBMIT),
+    ('TERM_PREEMPT', RESUBMIT),
+    ('TERM_REQUEUE_ADMIN', RESUBMIT),
+    ('TERM_ZOMBIE', RESUBMIT),
+    ('UNKNOWN', ESCALATE_BOTH),
+    # task exited non zero on its own
+    ('', None),
+    ('TERM_EXTERNAL_SIGNAL', None),
+])
+def test_classify_exit_reason(fail_reason, policy):
+    assert classify_exit_reason(fail_reason) == policy
+
+
+def test_parse_queue_tiers():
+    assert parse_queue_tiers(TIERS) == [
+        ('short', 64, 2), ('medium', 256, 48), ('long', 512, 168)
+    ]
+
+
+def test_select_queue_tier_smallest_fit():
+    tiers = parse_queue_tiers(TIERS)
+
+    assert select_queue_tier(tiers, '1:30', 8, 8) == (0, '1:30', 8)
+    # 8 cpus at 16GB is over the short tier memory cap
+    assert select_queue_tier(tiers, '1:30', 16, 8) == (1, '1:30', 16)
+    assert select_queue_tier(tiers, '24:00', 4, 1) == (1, '24:00', 4)
+
+
+def test_select_queue_tier_min_tier():
+    tiers = parse_queue_tiers(TIERS)
+
+    assert select_queue_tier(tiers, '1:30', 8, 1, min_tier=2) == (2, '1:30', 8)
+
+
+def test_select_queue_tier_clamped_to_largest():
+    tiers = parse_queue_tiers(TIERS)
+
+    assert select_queue_tier(tiers, '240:00', 128, 8) == (2, '168:00', 64)
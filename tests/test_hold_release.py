@@ -0,0 +1,61 @@
+import os
+import stat
+
+from mondrian_runner.critical_path import get_priority_file
+from mondrian_runner.hold_release import get_held_jobs_dir
+from mondrian_runner.hold_release import get_workflow_job_prefix
+from mondrian_runner.hold_release import record_held_job
+from mondrian_runner.hold_release import release_held_jobs
+from mondrian_runner.lsf import JobRecord
+from mondrian_runner.state import atomic_write_json
+
+RUN_ID = '9e1c2b7a-3f51-4e0b-b0d4-1d5c0f7a2e11'
+ROOT = '/juno/work/cromwell-executions/alignment/{}'.format(RUN_ID)
+
+
+class StubSnapshot(object):
+    def __init__(self, records):
+        self.records = {v.job_id: v for v in records}
+
+    def get_records(self):
+        return self.records
+
+
+def get_record(job_id, status, call):
+    return JobRecord({
+        'JOBID': job_id, 'STAT': status, 'JOB_NAME': 'cromwell_9e1c2b7a_{}'.format(call)
+    })
+
+
+def test_release_in_critical_path_order(tmpdir, monkeypatch):
+    bresume = tmpdir.join('bresume')
+    bresume.write('#!/bin/sh\necho "$@" >> {}\n'.format(tmpdir.join('bresume.log')))
+    os.chmod(str(bresume), stat.S_IRWXU)
+    monkeypatch.setenv('PATH', '{}:{}'.format(tmpdir, os.environ['PATH']))
+    state_dir = str(tmpdir.mkdir('state'))
+
+    atomic_write_json(get_priority_file(RUN_ID, state_dir=state_dir), {
+        'workflow': 'alignment', 'calls': {
+            'bwa_align': {'priority': 100}, 'merge': {'priority': 60}, 'metrics': {'priority': 1}
+        }
+    })
+    held = [
+        ('101', 'metrics'), ('102', 'merge'), ('103', 'bwa_align'), ('104', 'unknown_call')
+    ]
+    for job_id, call in held:
+        record_held_job(
+            'cromwell_9e1c2b7a_{}'.format(call), job_id,
+            '{}/call-{}'.format(ROOT, call), state_dir=state_dir
+        )
+    # submitted before the runner wrote priorities
+    records = [get_record(job_id, 'PSUSP', call) for job_id, call in held]
+    records.append(get_record('100', 'PSUSP', 'fastqc'))
+    records.append(get_record('99', 'PEND', 'fastqc'))
+
+    prefix = get_workflow_job_prefix(RUN_ID)
+    released = release_held_jobs(StubSnapshot(records), prefix, 5, state_dir=state_dir)
+
+    assert released == ['103', '102', '101', '100']
+    assert tmpdir.join('bresume.log').read() == '103 102 101 100\n'
+    held_dir = get_held_jobs_dir(prefix, state_dir=state_dir)
+    assert os.listdir(held_dir) == ['104.json']
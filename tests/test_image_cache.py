@@ -0,0 +1,36 @@
+import os
+
+from mondrian_runner.image_cache import ImageCache
+from mondrian_runner.state import locked
+
+
+def test_same_image_copied_once(tmpdir):
+    tmpdir.join('a.sif').write('image')
+    tmpdir.join('b.sif').write('image')
+    cache = ImageCache(str(tmpdir.join('cache')))
+
+    cached = cache.get(str(tmpdir.join('a.sif')))
+
+    assert cache.get(str(tmpdir.join('a.sif'))) == cached
+    assert cache.get(str(tmpdir.join('b.sif'))) == cached
+    with open(cached, 'rt') as reader:
+        assert reader.read() == 'image'
+    assert sorted(v for v in os.listdir(str(tmpdir.join('cache'))) if v.endswith('.sif')) == [
+        os.path.basename(cached)
+    ]
+
+
+def test_copy_outside_lock(tmpdir):
+    tmpdir.join('a.sif').write('image')
+    cache = ImageCache(str(tmpdir.join('cache')))
+
+    copy_and_hash = cache._copy_and_hash
+
+    def check_unlocked(image):
+        with locked(cache.lock_file, blocking=False) as acquired:
+            assert acquired
+        return copy_and_hash(image)
+
+    cache._copy_and_hash = check_unlocked
+
+    assert os.path.exists(cache.get(str(tmpdir.join('a.sif'))))
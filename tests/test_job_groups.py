@@ -0,0 +1,18 @@
+from mondrian_runner.job_groups import get_workflow_id
+from mondrian_runner.job_groups import get_workflow_root
+
+RUN_ID = '9e1c2b7a-3f51-4e0b-b0d4-1d5c0f7a2e11'
+SUB_RUN_ID = '51d0aa3e-0c4f-4a0e-9b8e-7f1d3c2b1a00'
+ROOT = '/juno/work/cromwell-executions/alignment/{}'.format(RUN_ID)
+
+
+def test_workflow_root_of_subworkflow_call():
+    cwd = '{}/call-lane/shard-0/align/{}/call-bwa_align/attempt-2'.format(ROOT, SUB_RUN_ID)
+
+    assert get_workflow_id(cwd) == RUN_ID
+    assert get_workflow_root(cwd) == ROOT
+
+
+def test_workflow_root_outside_cromwell():
+    assert get_workflow_id('/tmp/test/call-bwa_align') is None
+    assert get_workflow_root('/tmp/test/call-bwa_align') is None
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from mondrian_runner.lsf import JobRecord
+from mondrian_runner.lsf import _parse_history
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def read_data(filename):
+    with open(os.path.join(DATA_DIR, filename), 'rt') as reader:
+        return reader.read()
+
+
+def test_parse_bhist():
+    history = _parse_history(read_data('bhist_l.txt'))
+
+    assert sorted(history) == ['4211873', '4211880[3]', '4211899']
+
+    assert history['4211873'] == {
+        'exit_reason': 'TERM_RUNLIMIT', 'max_mem': 31.4, 'run_time': 14402.0, 'exec_host': 'ls05'
+    }
+
+    # job array element that finished normally, memory in Mbytes
+    assert history['4211880[3]']['exit_reason'] == ''
+    assert history['4211880[3]']['max_mem'] == pytest.approx(812 / 1024.0)
+    assert history['4211880[3]']['run_time'] == 601.0
+    assert history['4211880[3]']['exec_host'] == 'ls11'
+
+    # killed while pending, never dispatched
+    assert history['4211899'] == {
+        'exit_reason': 'TERM_OWNER', 'max_mem': None, 'run_time': 0.0, 'exec_host': None
+    }
+
+
+def test_parse_bacct():
+    history = _parse_history(read_data('bacct_l.txt'))
+
+    assert sorted(history) == ['4199012', '4199020']
+
+    # run time is the turnaround minus the wait in the queue
+    assert history['4199012'] == {
+        'exit_reason': 'TERM_MEMLIMIT', 'max_mem': 8.2, 'run_time': 1800.0, 'exec_host': 'ls21'
+    }
+    assert history['4199020'] == {
+        'exit_reason': '', 'max_mem': None, 'run_time': 300.0, 'exec_host': 'ls07'
+    }
+
+
+def test_job_record():
+    record = {
+        'JOBID': '4211880', 'JOBINDEX': '3', 'STAT': 'RUN', 'MEM': '3.5 Gbytes',
+        'MAX_MEM': '5.2 Gbytes', 'MEMLIMIT': '6 G', 'SLOTS': '8',
+        'CPU_USED': '000:01:28.50', 'RUN_TIME': '5342 second(s)', 'RUNTIMELIMIT': '240.0/ls05',
+        'JOB_NAME': 'cromwell_9e1c2b7a_alignment_workflow.bwa_align',
+        'EXEC_CWD': '/juno/work/shah/mondrian/call-bwa_align',
+        'EXEC_HOST': '4*ls05:4*ls06', 'EXIT_REASON': ''
+    }
+
+    job = JobRecord(record, timestamp=100)
+
+    assert job.timestamp == 100
+    assert job.job_id == '4211880[3]'
+    assert job.job_name == 'cromwell_9e1c2b7a_alignment_workflow.bwa_align'
+    assert job.status == 'RUN'
+    assert job.mem == 3.5
+    assert job.max_mem == 5.2
+    assert job.mem_limit == 6.0
+    assert job.slots == 8
+    assert job.requested_mem == 48.0
+    assert job.cpu_used == pytest.approx(88.5)
+    assert job.run_time == 5342.0
+    assert job.run_limit == 240 * 60
+    assert job.exec_cwd == '/juno/work/shah/mondrian/call-bwa_align'
+    assert job.exec_hosts == ['ls05', 'ls06']
+    assert job.exit_reason is None
+
+
+def test_job_record_pending():
+    record = {
+        'JOBID': '4211899', 'JOBINDEX': '0', 'STAT': 'PEND', 'MEM': '', 'MAX_MEM': '',
+        'MEMLIMIT': '4 G', 'SLOTS': '', 'CPU_USED': '0.0 second(s)', 'RUN_TIME': '0 second(s)',
+        'RUNTIMELIMIT': '-', 'JOB_NAME': 'cromwell_9e1c2b7a_alignment_workflow.merge',
+        'EXEC_CWD': '', 'EXEC_HOST': '', 'EXIT_REASON': ''
+    }
+
+    job = JobRecord(record)
+
+    assert job.job_id == '4211899'
+    assert job.mem is None
+    assert job.max_mem is None
+    assert job.requested_mem is None
+    assert job.run_time == 0.0
+    assert job.run_limit is None
+    assert job.exec_cwd is None
+    assert job.exec_hosts == []
@@ -0,0 +1,48 @@
+import pytest
+
+from mondrian_runner.poll_scheduler import PollScheduler
+from mondrian_runner.poll_scheduler import is_terminal_marker
+
+TERMINAL_LINES = [
+    '2024-10-05 14:01:07,512 INFO  - WorkflowExecutionActor-9e1c2b7a-3f51-4e0b-b0d4-1d5c0f7a2e11 '
+    '[UUID(9e1c2b7a)]: Workflow alignment_workflow complete. Final Outputs:',
+    '2024-10-05 14:01:08,020 INFO  - WorkflowActor-9e1c2b7a-3f51-4e0b-b0d4-1d5c0f7a2e11 '
+    '[UUID(9e1c2b7a)]: transitioning from FinalizingWorkflowState to WorkflowSucceededState.',
+    '2024-10-05 14:01:08,020 INFO  - WorkflowActor-9e1c2b7a-3f51-4e0b-b0d4-1d5c0f7a2e11 '
+    '[UUID(9e1c2b7a)]: transitioning from ExecutingWorkflowState to WorkflowFailedState',
+    '2024-10-05 14:01:08,020 INFO  - WorkflowActor-9e1c2b7a-3f51-4e0b-b0d4-1d5c0f7a2e11 '
+    '[UUID(9e1c2b7a)]: transitioning from AbortingWorkflowState to WorkflowAbortedState',
+]
+
+OTHER_LINES = [
+    '2024-10-05 10:01:02,118 INFO  - WorkflowExecutionActor-9e1c2b7a-3f51-4e0b-b0d4-1d5c0f7a2e11 '
+    '[UUID(9e1c2b7a)]: Starting alignment_workflow.bwa_align',
+    '2024-10-05 10:01:07,730 INFO  - BackgroundConfigAsyncJobExecutionActor '
+    '[UUID(9e1c2b7a)alignment_workflow.bwa_align:NA:1]: Status change from - to Running',
+    '2024-10-05 14:01:07,480 INFO  - WorkflowActor-9e1c2b7a-3f51-4e0b-b0d4-1d5c0f7a2e11 '
+    '[UUID(9e1c2b7a)]: transitioning from ExecutingWorkflowState to FinalizingWorkflowState',
+    '2024-10-05 14:01:07,480 INFO  - WorkflowManagerActor: Workflow with failed jobs aborted '
+    'by user request',
+    '2024-10-05 14:01:07,480 INFO  - SubWorkflowExecutionActor-1a2b3c4d [UUID(9e1c2b7a)]: '
+    'Workflow lane_workflow complete.',
+]
+
+
+@pytest.mark.parametrize('line', TERMINAL_LINES)
+def test_terminal_marker(line):
+    assert is_terminal_marker(line)
+
+
+@pytest.mark.parametrize('line', OTHER_LINES)
+def test_not_terminal_marker(line):
+    assert not is_terminal_marker(line)
+
+
+def test_terminal_marker_makes_check_due():
+    scheduler = PollScheduler(min_interval=30, max_interval=600)
+
+    scheduler.activity(OTHER_LINES)
+    assert not scheduler.due()
+
+    scheduler.activity(TERMINAL_LINES[:1])
+    assert scheduler.due()
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import pytest
+
+# cromwell starts a new process for every check_alive and generate_bsub_command
+# call, thousands per run. budget in seconds for importing the modules each needs
+IMPORT_BUDGET = 0.06
+
+ENTRY_POINTS = {
+    'check_alive': [
+        'mondrian_runner.main', 'mondrian_runner.check_alive_client',
+        'mondrian_runner.check_alive'
+    ],
+    'generate_bsub_command': ['mondrian_runner.main', 'mondrian_runner.generate_bsub_command'],
+}
+
+TIME_IMPORT = (
+    'import time\n'
+    'start = time.perf_counter()\n'
+    'import {}\n'
+    'print(time.perf_counter() - start)\n'
+)
+
+
+def time_import(modules):
+    cmd = [sys.executable, '-c', TIME_IMPORT.format(', '.join(modules))]
+    return float(subprocess.check_output(cmd).decode())
+
+
+@pytest.mark.parametrize('entry_point', sorted(ENTRY_POINTS))
+def test_import_time(entry_point):
+    # best of several runs, the first may pay for a cold page cache
+    elapsed = min(time_import(ENTRY_POINTS[entry_point]) for _ in range(5))
+    assert elapsed < IMPORT_BUDGET, '{} imports took {:.0f}ms, budget is {:.0f}ms'.format(
+        entry_point, elapsed * 1000, IMPORT_BUDGET * 1000
+    )
+
+
+@pytest.mark.parametrize('entry_point', sorted(ENTRY_POINTS))
+def test_no_optional_feature_imports(entry_point):
+    cmd = [
+        sys.executable, '-c',
+        'import sys, {}; print(" ".join(sys.modules))'.format(', '.join(ENTRY_POINTS[entry_point]))
+    ]
+    modules = subprocess.check_output(cmd).decode().split()
+
+    for module in [
+        'pkg_resources', 'sqlite3', 'http.client', 'ctypes', 'asyncio',
+        'mondrian_runner.utils', 'mondrian_runner.usage_history'
+    ]:
+        assert module not in modules, '{} imports {}'.format(entry_point, module)
@@ -0,0 +1,28 @@
+import json
+
+from mondrian_runner.state import atomic_write_json
+from mondrian_runner.state import locked
+
+
+def test_atomic_write_json(tmpdir):
+    path = str(tmpdir.join('data.json'))
+
+    atomic_write_json(path, {'a': 1})
+    atomic_write_json(path, {'a': 2})
+
+    with open(path, 'rt') as reader:
+        assert json.load(reader) == {'a': 2}
+    assert tmpdir.listdir() == [tmpdir.join('data.json')]
+
+
+def test_locked_non_blocking(tmpdir):
+    lock_file = str(tmpdir.join('lock'))
+
+    with locked(lock_file) as acquired:
+        assert acquired
+        # flock locks are per open file, a second open in this process conflicts too
+        with locked(lock_file, blocking=False) as acquired_again:
+            assert not acquired_again
+
+    with locked(lock_file, blocking=False) as acquired:
+        assert acquired